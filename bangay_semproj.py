@@ -1,5 +1,6 @@
 import os
 import sqlite3
+import threading
 import datetime
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
@@ -9,6 +10,14 @@ from PIL import Image, ImageTk
 import webbrowser
 import json
 import csv
+import bisect
+import hashlib
+import itertools
+import math
+import queue
+import random
+import re
+import time
 from datetime import datetime, timedelta
 
 # ==================== COLOR THEME ==================== 
@@ -30,6 +39,9 @@ COLORS = {
 class Medicine:
     """Represents a medicine or supply in the inventory"""
 
+    __slots__ = ('id', 'name', 'price', 'stock', 'category', 'brand',
+                 'animal_type', 'dosage', 'expiration_date')
+
     def __init__(self, id=None, name="", price=0.0, stock=0, category="", brand="",
                  animal_type="", dosage="", expiration_date=""):
         self.id = id
@@ -75,6 +87,8 @@ class Medicine:
 class CartItem:
     """Represents an item in the shopping cart (for medicines/supplies/foods)"""
 
+    __slots__ = ('item_id', 'name', 'price', 'quantity', 'category')
+
     def __init__(self, item_id, name, price, quantity=1, category=""):
         self.item_id = item_id
         self.name = name
@@ -100,6 +114,10 @@ class CartItem:
 class Appointment:
     """Represents a veterinary appointment"""
 
+    __slots__ = ('appointment_id', 'patient_name', 'owner_name', 'animal_type', 'service',
+                 'notes', 'status', 'date', 'services', 'items', 'total_amount',
+                 'start_time', 'end_time', 'vet', 'room', 'patient_id')
+
     def __init__(self, appointment_id="", patient_name="", owner_name="", animal_type="", 
                  service="", notes="", status="SCHEDULED"):
         self.appointment_id = appointment_id
@@ -111,7 +129,14 @@ class Appointment:
         self.status = status
         self.date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         self.services = []
+        self.items = []  # consumables, in the cart's legacy line format
         self.total_amount = 0.0
+        # Scheduled slot, 'YYYY-MM-DD HH:MM:SS' strings; None when unscheduled
+        self.start_time = None
+        self.end_time = None
+        self.vet = None
+        self.room = None
+        self.patient_id = None  # patients.id, filled in when recorded
 
     def add_service(self, service_name, quantity, price, subtotal):
         """Add service to appointment with proper pricing"""
@@ -123,6 +148,18 @@ class Appointment:
         })
         self.total_amount += subtotal
 
+    def add_item(self, item_id, item_name, quantity, price):
+        """Add a consumable inventory item used during the visit"""
+        subtotal = price * quantity
+        self.items.append({
+            'id': item_id,
+            'name': item_name,
+            'qty': quantity,
+            'price': price,
+            'subtotal': subtotal
+        })
+        self.total_amount += subtotal
+
     def to_dict(self):
         """Convert appointment to dictionary for database operations"""
         return {
@@ -135,13 +172,113 @@ class Appointment:
             'status': self.status,
             'date': self.date,
             'total_amount': self.total_amount,
-            'services': self.services
+            'services': self.services,
+            'items': self.items,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'vet': self.vet,
+            'room': self.room,
+            'patient_id': self.patient_id
         }
 
 
+class AppointmentBuilder:
+    """Collects the services and consumables of one visit into an Appointment.
+
+    Calls chain: AppointmentBuilder(patient, owner).add_service("Checkup")
+    .add_item(medicine, 2).schedule(start, vet="Dr. Cruz").build(). build()
+    raises ValueError when a required field is missing, nothing was added or
+    the slot is outside clinic hours.
+    """
+
+    def __init__(self, patient_name, owner_name, animal_type="", notes="", status="SCHEDULED",
+                 appointment_id=None):
+        self.patient_name = patient_name.strip()
+        self.owner_name = owner_name.strip()
+        self.animal_type = animal_type
+        self.notes = notes
+        self.status = status
+        self.appointment_id = appointment_id
+        self.services = {}  # service -> [quantity, price]
+        self.items = {}  # item id -> [name, quantity, price]
+        self.start_time = None
+        self.vet = None
+        self.room = None
+        self.minutes = None
+
+    def add_service(self, service, quantity=1, price=None):
+        """Add a service, priced from SERVICE_PRICES unless price is given"""
+        if price is None:
+            if service not in SERVICE_PRICES:
+                raise ValueError(f"Unknown service: {service}")
+            price = SERVICE_PRICES[service]
+        line = self.services.setdefault(service, [0, price])
+        line[0] += quantity
+        return self
+
+    def add_item(self, medicine, quantity=1):
+        """Add a consumable Medicine from inventory, charged at its price"""
+        line = self.items.setdefault(medicine.id, [medicine.name, 0, medicine.price])
+        line[1] += quantity
+        return self
+
+    def schedule(self, start_time, vet=None, room=None, minutes=None):
+        """Book the visit at start_time (datetime or 'YYYY-MM-DD HH:MM') with a
+        vet and/or room; minutes defaults to the services' SERVICE_MINUTES"""
+        self.start_time = parse_schedule_time(start_time)
+        self.vet = vet or None
+        self.room = room or None
+        self.minutes = minutes
+        return self
+
+    def build(self):
+        """Validate and return the Appointment with its service and item lines"""
+        if not self.patient_name:
+            raise ValueError("Patient name is required")
+        if not self.owner_name:
+            raise ValueError("Owner name is required")
+        if not self.services and not self.items:
+            raise ValueError("Add at least one service or item")
+        if self.start_time is not None:
+            if self.vet is None and self.room is None:
+                raise ValueError("A scheduled appointment needs a vet or a room")
+            if self.vet is not None and self.vet not in CLINIC_VETS:
+                raise ValueError(f"Unknown vet: {self.vet}")
+            if self.room is not None and self.room not in CLINIC_ROOMS:
+                raise ValueError(f"Unknown room: {self.room}")
+            minutes = self.minutes or sum(SERVICE_MINUTES.get(service, SLOT_MINUTES) * quantity
+                                          for service, (quantity, price) in self.services.items())
+            end_time = self.start_time + timedelta(minutes=minutes or SLOT_MINUTES)
+            opens, closes = clinic_hours(self.start_time)
+            if self.start_time < opens or end_time > closes:
+                raise ValueError(f"Appointments must fall between {opens:%H:%M} and {closes:%H:%M}")
+
+        appointment = Appointment(
+            appointment_id=self.appointment_id or generate_appointment_id(),
+            patient_name=self.patient_name,
+            owner_name=self.owner_name,
+            animal_type=self.animal_type,
+            service=", ".join(self.services),
+            notes=self.notes,
+            status=self.status
+        )
+        for service, (quantity, price) in self.services.items():
+            appointment.add_service(service, quantity, price, price * quantity)
+        for item_id, (name, quantity, price) in self.items.items():
+            appointment.add_item(item_id, name, quantity, price)
+        if self.start_time is not None:
+            appointment.start_time = format_schedule_time(self.start_time)
+            appointment.end_time = format_schedule_time(end_time)
+            appointment.vet = self.vet
+            appointment.room = self.room
+        return appointment
+
+
 class User:
     """Represents a system user (vet or staff)"""
 
+    __slots__ = ('id', 'username', 'password', 'role')
+
     def __init__(self, id=None, username="", password="", role="staff"):
         self.id = id
         self.username = username
@@ -153,59 +290,428 @@ class User:
         return self.username == input_username and self.password == input_password
 
 
+class BulkLoadResult:
+    """Outcome of a bulk inventory load"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.conflicts = []  # (row_number, name, category, reason)
+
+    @property
+    def processed(self):
+        return self.inserted + self.updated + len(self.conflicts)
+
+
+class InsufficientStockError(Exception):
+    """Raised when a sale asks for more stock than is on hand.
+
+    shortages lists (item_id, name, requested, available) for every short
+    line; name is None and available 0 for items that no longer exist.
+    """
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__("; ".join(f"{name or item_id}: requested {requested}, available {available}"
+                                   for item_id, name, requested, available in shortages))
+
+
+class ScheduleConflictError(Exception):
+    """Raised when an appointment's slot overlaps another booking.
+
+    conflicts lists (resource, name, appointment_id, start_time, end_time)
+    for every clash, resource being "vet" or "room".
+    """
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__("; ".join(f"{name} is booked {start} - {end} ({appointment_id})"
+                                   for resource, name, appointment_id, start, end in conflicts))
+
+
+class KeysetSource:
+    """Keyset-paginated rows of a query, for VirtualTreeview.
+
+    key_columns must identify a row uniquely and define its order (all
+    ascending, or all descending when descending is set). The rows after the
+    last key seen are fetched as the ones sharing its longest key prefix,
+    then the next shorter one: equality on the prefix plus a range on the
+    next key, which SQLite can seek even on an expression index (a row-value
+    comparison cannot). So every page costs a few index seeks instead of an
+    OFFSET scan.
+    """
+
+    def __init__(self, db, columns, from_sql, key_columns, where="", params=(), descending=False):
+        self.db = db
+        self.columns = columns
+        self.from_sql = from_sql
+        self.key_columns = key_columns
+        self.where = where
+        self.params = tuple(params)
+        self.descending = descending
+
+    def _query(self, select, after, reverse, limit, fixed=0):
+        """SQL and params for rows after key after whose first fixed key
+        columns equal after's"""
+        clauses = [f"({self.where})"] if self.where else []
+        params = list(self.params)
+        backwards = reverse != self.descending
+        if after is not None:
+            for column, value in zip(self.key_columns[:fixed], after):
+                clauses.append(f"{column} = ?")
+                params.append(value)
+            clauses.append(f"{self.key_columns[fixed]} {'<' if backwards else '>'} ?")
+            params.append(after[fixed])
+        # Keys held equal stay out of the ORDER BY, or SQLite sorts an expression index's rows again
+        order = ", ".join(f"{column} {'DESC' if backwards else 'ASC'}" for column in self.key_columns[fixed:])
+        sql = f"SELECT {select} {self.from_sql}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return sql + f" ORDER BY {order} LIMIT ?", params + [limit]
+
+    def count(self):
+        """Number of rows in the query"""
+        try:
+            sql = f"SELECT COUNT(*) {self.from_sql}"
+            if self.where:
+                sql += f" WHERE {self.where}"
+            return self.db.execute(sql, self.params).fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error counting rows: {e}")
+            return 0
+
+    def page(self, after=None, limit=50, reverse=False):
+        """Up to limit (key, row) pairs following key after, or preceding it
+        (nearest first) when reverse is set"""
+        try:
+            select = ", ".join(self.columns + self.key_columns)
+            width = len(self.key_columns)
+            rows = []
+            for fixed in range(width - 1, -1, -1) if after is not None else (0,):
+                sql, params = self._query(select, after, reverse, limit - len(rows), fixed)
+                rows.extend(self.db.execute(sql, params))
+                if len(rows) >= limit:
+                    break
+            return [(row[-width:], row[:-width]) for row in rows]
+        except sqlite3.Error as e:
+            print(f"Error fetching page: {e}")
+            return []
+
+    def key_at(self, offset):
+        """Key to pass as after to start a page at row offset (None for 0)"""
+        if offset <= 0:
+            return None
+        try:
+            sql, params = self._query(", ".join(self.key_columns), None, False, 1)
+            row = self.db.execute(sql + " OFFSET ?", params + [offset - 1]).fetchone()
+            return tuple(row) if row else None
+        except sqlite3.Error as e:
+            print(f"Error seeking rows: {e}")
+            return None
+
+
+class QueryPage:
+    """One page of a manager's query() results"""
+
+    def __init__(self, rows, next_cursor):
+        self.rows = rows
+        self.next_cursor = next_cursor  # pass as QuerySpec.cursor for the next page; None at the end
+
+
+class QuerySpec:
+    """Filters, sort, keyset cursor and page size for a manager's query().
+
+    filters maps a column name to a value (equality), an (operator, value)
+    pair or a list of such pairs; operators are =, !=, <, <=, >, >=, LIKE and
+    PREFIX, which becomes an indexable range. sort is a column name or a sequence of them, prefixed
+    with "-" for descending (all columns must share a direction); nullable
+    sort columns are keyed as COALESCE(column, '') because a comparison
+    against NULL never matches. cursor is QueryPage.next_cursor of
+    the previous page.
+    """
+
+    OPERATORS = ("=", "!=", "<", "<=", ">", ">=", "LIKE")
+
+    def __init__(self, filters=None, sort=None, cursor=None, page_size=50):
+        self.filters = filters or {}
+        self.sort = sort
+        self.cursor = cursor
+        self.page_size = page_size
+
+    @staticmethod
+    def _column(columns, name):
+        if name not in columns:
+            raise ValueError(f"Unknown column: {name}")
+        return columns[name]
+
+    def source(self, db, columns, select, from_sql, unique_keys, default_sort, nullable=()):
+        """KeysetSource running this spec.
+
+        columns maps the names usable in filters and sort to SQL expressions,
+        select names the columns of each returned row, and unique_keys lists
+        column sets that identify a row; the first must be a single column
+        and breaks ties when the sort is not unique. nullable names the
+        columns that may hold NULL.
+        """
+        sort = self.sort or default_sort
+        if isinstance(sort, str):
+            sort = (sort,)
+        directions = {name.startswith("-") for name in sort}
+        if len(directions) != 1:
+            raise ValueError("Sort columns must all be ascending or all descending")
+        names = [name.lstrip("-") for name in sort]
+        if not any(set(key) <= set(names) for key in unique_keys):
+            names.append(unique_keys[0][0])
+
+        clauses = []
+        params = []
+        for name, conditions in self.filters.items():
+            expression = self._column(columns, name)
+            if not isinstance(conditions, list):
+                conditions = [conditions if isinstance(conditions, tuple) else ("=", conditions)]
+            for operator, value in conditions:
+                self._add_condition(clauses, params, expression, operator, value)
+
+        keys = [f"COALESCE({self._column(columns, name)}, '')" if name in nullable
+                else self._column(columns, name) for name in names]
+        return KeysetSource(db, [self._column(columns, name) for name in select], from_sql, keys,
+                            where=" AND ".join(clauses), params=params, descending=directions.pop())
+
+    def _add_condition(self, clauses, params, expression, operator, value):
+        if operator == "PREFIX":
+            if value:
+                clauses.append(f"{expression} >= ? AND {expression} < ?")
+                params.extend([value, value[:-1] + chr(ord(value[-1]) + 1)])
+        elif operator not in self.OPERATORS:
+            raise ValueError(f"Unknown filter operator: {operator}")
+        elif value is None and operator in ("=", "!="):
+            clauses.append(f"{expression} IS {'' if operator == '=' else 'NOT '}NULL")
+        else:
+            clauses.append(f"{expression} {operator} ?")
+            params.append(value)
+
+    def fetch(self, source):
+        """Run source for this spec's cursor and page size"""
+        page = source.page(self.cursor, self.page_size + 1)
+        rows = [row for key, row in page[:self.page_size]]
+        next_cursor = page[self.page_size - 1][0] if len(page) > self.page_size else None
+        return QueryPage(rows, next_cursor)
+
+
+class RowSource:
+    """In-memory rows with the KeysetSource interface (keys are positions)"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def count(self):
+        return len(self.rows)
+
+    def page(self, after=None, limit=50, reverse=False):
+        if reverse:
+            end = len(self.rows) if after is None else after
+            return [(i, self.rows[i]) for i in range(end - 1, max(0, end - limit) - 1, -1)]
+        start = 0 if after is None else after + 1
+        return [(i, self.rows[i]) for i in range(start, min(len(self.rows), start + limit))]
+
+    def key_at(self, offset):
+        return offset - 1 if offset > 0 else None
+
+
+class InventoryCache:
+    """Process-wide cache of inventory items keyed by id.
+
+    Filled from the database on first use and kept coherent by write-through:
+    every InventoryManager/SalesManager write refreshes the rows it touched,
+    and bulk loads, seeding and database swaps invalidate the whole cache.
+    Commits made through any other connection (another terminal, process or
+    thread) change the reading connection's PRAGMA data_version, which every
+    read checks; the cache then reloads.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._items = None  # id -> Medicine, None until loaded
+        self._ordered = None  # items sorted like ORDER BY category, name
+        self._versions = {}  # connection -> data_version when it last saw the cache current
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, conn):
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM inventory")
+        self._items = {row[0]: InventoryManager._row_to_medicine(row) for row in cur.fetchall()}
+        self._ordered = None
+
+    def _ensure_loaded(self, conn):
+        # A connection seen for the first time can't tell what changed before it
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._items is None or self._versions.get(conn) != version:
+            self.misses += 1
+            self._load(conn)
+        else:
+            self.hits += 1
+        self._versions[conn] = version
+
+    def all_items(self, conn):
+        """All cached items ordered by category, name"""
+        with self._lock:
+            self._ensure_loaded(conn)
+            if self._ordered is None:
+                # Missing categories and names sort first, as in SQL
+                self._ordered = sorted(self._items.values(), key=lambda m: (m.category or "", m.name or ""))
+            return list(self._ordered)
+
+    def get(self, conn, item_id):
+        """Cached item by id, or None"""
+        with self._lock:
+            self._ensure_loaded(conn)
+            return self._items.get(item_id)
+
+    def refresh(self, conn, item_ids):
+        """Re-read the given ids after a write (drops ids that no longer exist)"""
+        with self._lock:
+            if self._items is None:
+                return
+            item_ids = list(set(item_ids))
+            cur = conn.cursor()
+            for start in range(0, len(item_ids), 500):
+                chunk = item_ids[start:start + 500]
+                for item_id in chunk:
+                    self._items.pop(item_id, None)
+                cur.execute(f"SELECT * FROM inventory WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                for row in cur.fetchall():
+                    self._items[row[0]] = InventoryManager._row_to_medicine(row)
+            self._ordered = None
+
+    def invalidate(self):
+        """Forget everything; the next read reloads from the database"""
+        with self._lock:
+            self._items = None
+            self._ordered = None
+            self._versions.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': 0 if self._items is None else len(self._items)}
+
+
+INVENTORY_CACHE = InventoryCache()
+
+
 class InventoryManager:
     """Manages inventory operations for medicines and foods"""
 
-    def __init__(self, db_connection):
+    BULK_CHUNK_SIZE = 500
+    # Values for fields a bulk-loaded Medicine leaves as None, when it is inserted
+    INSERT_DEFAULTS = {"stock": 0, "brand": "", "animal_type": "All", "dosage": "N/A", "expiration_date": ""}
+    SEARCH_LIMIT = 200
+    FUZZY_SEARCH_LIMIT = 50
+    QUERY_COLUMNS = {name: name for name in ("id", "name", "price", "stock", "category", "brand",
+                                             "animal_type", "dosage", "expiration_date")}
+    QUERY_NULLABLE = frozenset(("name", "category", "brand", "animal_type", "dosage", "expiration_date"))
+
+    def __init__(self, db_connection, cache=INVENTORY_CACHE):
         self.db = db_connection
+        self.cache = cache
+        self._fts_tables = None
 
     def get_all_items(self):
         """Get all items from inventory (medicines and foods)"""
         try:
-            cur = self.db.cursor()
-            cur.execute("SELECT * FROM inventory ORDER BY category, name")
-            rows = cur.fetchall()
-            items = []
-            for row in rows:
-                item = Medicine(
-                    id=row[0],
-                    name=row[1],
-                    price=row[2],
-                    stock=row[3],
-                    category=row[4],
-                    brand=row[6] if len(row) > 6 else "",
-                    animal_type=row[7] if len(row) > 7 else "",
-                    dosage=row[8] if len(row) > 8 else "",
-                    expiration_date=row[9] if len(row) > 9 else ""
-                )
-                items.append(item)
-            return items
+            return self.cache.all_items(self.db)
         except sqlite3.Error as e:
             print(f"Error getting items: {e}")
             return []
 
-    def search_items(self, search_term):
-        """Search items by name"""
+    def item_pages(self, in_stock_only=False):
+        """Inventory rows paged by category, name (see query())"""
+        return self.pages(QuerySpec(filters={"stock": (">", 0)} if in_stock_only else None))
+
+    def pages(self, spec=None):
+        """KeysetSource over inventory rows for a QuerySpec (see query())"""
+        return (spec or QuerySpec()).source(self.db, self.QUERY_COLUMNS, tuple(self.QUERY_COLUMNS),
+                                            "FROM inventory", (("id",),),
+                                            ("category", "name"), self.QUERY_NULLABLE)
+
+    def query(self, spec):
+        """One page of inventory rows (id, name, price, stock, category, brand,
+        animal_type, dosage, expiration_date) matching spec"""
+        return spec.fetch(self.pages(spec))
+
+    def get_item(self, item_id):
+        """Get a single item by id, or None"""
+        try:
+            return self.cache.get(self.db, item_id)
+        except sqlite3.Error as e:
+            print(f"Error getting item: {e}")
+            return None
+
+    @staticmethod
+    def _row_to_medicine(row):
+        """Build a Medicine from a SELECT * FROM inventory row"""
+        return Medicine(
+            id=row[0],
+            name=row[1],
+            price=row[2],
+            stock=row[3],
+            category=row[4],
+            brand=row[6] if len(row) > 6 else "",
+            animal_type=row[7] if len(row) > 7 else "",
+            dosage=row[8] if len(row) > 8 else "",
+            expiration_date=row[9] if len(row) > 9 else ""
+        )
+
+    def _search_tables(self):
+        """Names of the full-text search tables present in this database"""
+        if self._fts_tables is None:
+            cur = self.db.cursor()
+            cur.execute("SELECT name FROM sqlite_master WHERE type='table' "
+                        "AND name IN ('inventory_fts', 'inventory_trigram')")
+            self._fts_tables = {row[0] for row in cur.fetchall()}
+        return self._fts_tables
+
+    def search_items(self, search_term, fuzzy=True, limit=SEARCH_LIMIT):
+        """Search items by name, brand, category, animal type or dosage.
+
+        Every word is matched as a prefix and results are ranked by relevance.
+        When nothing matches and fuzzy is set, falls back to trigram similarity
+        so misspellings still find items. Uses LIKE when FTS5 is unavailable.
+        At most limit items are returned (None for all).
+        """
+        limit = -1 if limit is None else limit
         try:
             cur = self.db.cursor()
-            cur.execute("SELECT * FROM inventory WHERE name LIKE ? OR category LIKE ? ORDER BY category, name",
-                        (f"%{search_term}%", f"%{search_term}%"))
+            tables = self._search_tables()
+            if "inventory_fts" not in tables:
+                cur.execute("SELECT * FROM inventory WHERE name LIKE ? OR category LIKE ? "
+                            "ORDER BY category, name LIMIT ?",
+                            (f"%{search_term}%", f"%{search_term}%", limit))
+                return [self._row_to_medicine(row) for row in cur.fetchall()]
+
+            words = re.findall(r"\w+", search_term)
+            if not words:
+                return []
+
+            cur.execute("""SELECT inventory.* FROM inventory_fts
+                        JOIN inventory ON inventory.id = inventory_fts.rowid
+                        WHERE inventory_fts MATCH ?
+                        ORDER BY bm25(inventory_fts, 10.0, 2.0, 1.0, 1.0, 1.0) LIMIT ?""",
+                        (" ".join(f'"{word}"*' for word in words), limit))
             rows = cur.fetchall()
-            items = []
-            for row in rows:
-                item = Medicine(
-                    id=row[0],
-                    name=row[1],
-                    price=row[2],
-                    stock=row[3],
-                    category=row[4],
-                    brand=row[6] if len(row) > 6 else "",
-                    animal_type=row[7] if len(row) > 7 else "",
-                    dosage=row[8] if len(row) > 8 else "",
-                    expiration_date=row[9] if len(row) > 9 else ""
-                )
-                items.append(item)
-            return items
+
+            if not rows and fuzzy and "inventory_trigram" in tables:
+                trigrams = {word[i:i + 3].lower() for word in words for i in range(len(word) - 2)}
+                if trigrams:
+                    cur.execute("""SELECT inventory.* FROM inventory_trigram
+                                JOIN inventory ON inventory.id = inventory_trigram.rowid
+                                WHERE inventory_trigram MATCH ?
+                                ORDER BY rank LIMIT ?""",
+                                (" OR ".join(f'"{gram}"' for gram in trigrams), self.FUZZY_SEARCH_LIMIT))
+                    rows = cur.fetchall()
+
+            return [self._row_to_medicine(row) for row in rows]
         except sqlite3.Error as e:
             print(f"Error searching items: {e}")
             return []
@@ -217,11 +723,70 @@ class InventoryManager:
             cur.execute("UPDATE inventory SET stock = stock - ? WHERE id = ?",
                         (quantity_used, item_id))
             self.db.commit()
+            self.cache.refresh(self.db, [item_id])
             return True
         except sqlite3.Error as e:
             print(f"Error updating stock: {e}")
             return False
 
+    def reserve_stock(self, items, cur=None):
+        """Check and take stock for a cart in one pass.
+
+        items is a ShoppingCart or its to_legacy_format() lines. All lines are
+        read with one SELECT ... IN and decremented with a conditional
+        UPDATE ... WHERE stock >= ?, so a concurrent sale can never push stock
+        below zero. Raises InsufficientStockError listing every short line and
+        changes nothing in that case. With cur the work joins the caller's
+        transaction; otherwise it runs in its own run_in_transaction().
+        """
+        if isinstance(items, ShoppingCart):
+            items = items.to_legacy_format()
+        quantities = {}
+        for item in items:
+            quantities[item['id']] = quantities.get(item['id'], 0) + item['qty']
+        if not quantities:
+            return True
+
+        if cur is None:
+            run_in_transaction(self.db, lambda cur: self.reserve_stock(items, cur))
+            self.cache.refresh(self.db, list(quantities))
+            return True
+
+        cur.execute(f"SELECT id, name, stock FROM inventory WHERE id IN ({','.join('?' * len(quantities))})",
+                    list(quantities))
+        on_hand = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+        shortages = self._shortages(quantities, on_hand)
+        if not shortages:
+            for item_id, qty in quantities.items():
+                cur.execute("UPDATE inventory SET stock = stock - ? WHERE id = ? AND stock >= ?",
+                            (qty, item_id, qty))
+                if cur.rowcount != 1:
+                    # Another sale took the stock between the read and the update
+                    cur.execute("SELECT name, stock FROM inventory WHERE id = ?", (item_id,))
+                    name, stock = cur.fetchone() or (None, 0)
+                    shortages.append((item_id, name, qty, stock or 0))
+        if shortages:
+            raise InsufficientStockError(shortages)
+        return True
+
+    def release_stock(self, items, cur):
+        """Put back stock taken by reserve_stock() for items, in the caller's transaction"""
+        quantities = {}
+        for item in items:
+            quantities[item['id']] = quantities.get(item['id'], 0) + item['qty']
+        cur.executemany("UPDATE inventory SET stock = stock + ? WHERE id = ?",
+                        [(qty, item_id) for item_id, qty in quantities.items()])
+        return list(quantities)
+
+    @staticmethod
+    def _shortages(quantities, on_hand):
+        shortages = []
+        for item_id, qty in quantities.items():
+            name, stock = on_hand.get(item_id, (None, 0))
+            if stock is None or stock < qty:
+                shortages.append((item_id, name, qty, stock or 0))
+        return shortages
+
     def add_item(self, medicine):
         """Add new item to inventory"""
         try:
@@ -232,6 +797,7 @@ class InventoryManager:
                         (medicine.name, medicine.price, medicine.stock, medicine.category,
                          medicine.brand, medicine.animal_type, medicine.dosage, medicine.expiration_date))
             self.db.commit()
+            self.cache.refresh(self.db, [cur.lastrowid])
             return True
         except sqlite3.Error as e:
             print(f"Error adding item: {e}")
@@ -247,6 +813,7 @@ class InventoryManager:
                         (medicine.name, medicine.price, medicine.stock, medicine.category,
                          medicine.brand, medicine.animal_type, medicine.dosage, medicine.expiration_date, medicine.id))
             self.db.commit()
+            self.cache.refresh(self.db, [medicine.id])
             return True
         except sqlite3.Error as e:
             print(f"Error updating item: {e}")
@@ -258,99 +825,491 @@ class InventoryManager:
             cur = self.db.cursor()
             cur.execute("DELETE FROM inventory WHERE id=?", (item_id,))
             self.db.commit()
+            self.cache.refresh(self.db, [item_id])
             return True
         except sqlite3.Error as e:
             print(f"Error deleting item: {e}")
             return False
 
+    def get_stock_summary(self, low_stock_threshold=None):
+        """Return (item_count, low_stock_count, total_value) aggregated in SQL"""
+        if low_stock_threshold is None:
+            low_stock_threshold = LOW_STOCK_THRESHOLD
+        try:
+            cur = self.db.cursor()
+            cur.execute("""SELECT COUNT(*), COALESCE(SUM(stock < ?), 0), COALESCE(SUM(price * stock), 0)
+                        FROM inventory""", (low_stock_threshold,))
+            return cur.fetchone()
+        except sqlite3.Error as e:
+            print(f"Error getting stock summary: {e}")
+            return (0, 0, 0.0)
+
+    def add_items(self, medicines, chunk_size=BULK_CHUNK_SIZE):
+        """Insert many items in a single transaction.
+
+        Items whose (category, name) already exists, in the table or earlier
+        in the input, are skipped and reported in the result's conflicts.
+        Returns a BulkLoadResult, or None if the load was rolled back.
+        """
+        return self._bulk_load(medicines, chunk_size, upsert=False)
+
+    def upsert_items(self, medicines, chunk_size=BULK_CHUNK_SIZE):
+        """Insert new items and overwrite existing ones (matched by category
+        and name) in a single transaction. Later rows win over earlier ones.
+        Returns a BulkLoadResult, or None if the load was rolled back.
+        """
+        return self._bulk_load(medicines, chunk_size, upsert=True)
+
+    def _existing_keys(self, cur, chunk):
+        """Return the (category, name) pairs of the chunk already in the table"""
+        names_by_category = {}
+        for medicine in chunk:
+            names_by_category.setdefault(medicine.category, set()).add(medicine.name)
+
+        existing = set()
+        for category, names in names_by_category.items():
+            names = list(names)
+            placeholders = ", ".join("?" * len(names))
+            cur.execute(f"SELECT name FROM inventory WHERE category = ? AND name IN ({placeholders})",
+                        [category] + names)
+            existing.update((category, row[0]) for row in cur.fetchall())
+        return existing
+
+    def _bulk_load(self, medicines, chunk_size, upsert):
+        """Stream medicines through executemany in chunks inside one transaction"""
+        result = BulkLoadResult()
+        rows = iter(medicines)
+        row_number = 0
+        try:
+            cur = self.db.cursor()
+            cur.execute("BEGIN")
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+
+                existing = self._existing_keys(cur, chunk)
+                inserts = []
+                updates = []
+                for medicine in chunk:
+                    row_number += 1
+                    key = (medicine.category, medicine.name)
+                    if not medicine.name:
+                        result.conflicts.append((row_number, medicine.name, medicine.category, "missing name"))
+                    elif key in existing:
+                        if upsert:
+                            # None means "not given": the UPDATE keeps the current value
+                            updates.append((medicine.price, medicine.stock, medicine.brand, medicine.animal_type,
+                                            medicine.dosage, medicine.expiration_date,
+                                            medicine.category, medicine.name))
+                        else:
+                            result.conflicts.append((row_number, medicine.name, medicine.category, "already exists"))
+                    else:
+                        existing.add(key)
+                        inserts.append((medicine.name, medicine.price, medicine.category) + tuple(
+                            default if getattr(medicine, field) is None else getattr(medicine, field)
+                            for field, default in self.INSERT_DEFAULTS.items()))
+
+                cur.executemany("""INSERT INTO inventory 
+                                (name, price, category, stock, brand, animal_type, dosage, expiration_date) 
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", inserts)
+                cur.executemany("""UPDATE inventory SET 
+                                price=COALESCE(?, price), stock=COALESCE(?, stock), brand=COALESCE(?, brand),
+                                animal_type=COALESCE(?, animal_type), dosage=COALESCE(?, dosage),
+                                expiration_date=COALESCE(?, expiration_date)
+                                WHERE category=? AND name=?""", updates)
+                result.inserted += len(inserts)
+                result.updated += len(updates)
+
+            self.db.commit()
+            self.cache.invalidate()
+            return result
+        except sqlite3.Error as e:
+            print(f"Error bulk loading items (row {row_number}): {e}")
+            self.db.rollback()
+            return None
+        except Exception:
+            # e.g. the source iterable failed while reading a file
+            self.db.rollback()
+            raise
+
+
+def parse_schedule_time(value):
+    """datetime from a datetime or a 'YYYY-MM-DD HH:MM[:SS]' string"""
+    if isinstance(value, datetime):
+        return value.replace(microsecond=0)
+    return datetime.fromisoformat(value.strip())
+
+def format_schedule_time(value):
+    """'YYYY-MM-DD HH:MM:SS', the form start_time/end_time are stored and compared in"""
+    return value.replace(microsecond=0).isoformat(" ")
+
+def clinic_hours(day):
+    """(opening, closing) datetimes of the clinic day containing day"""
+    midnight = day.replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight + timedelta(hours=CLINIC_HOURS[0]), midnight + timedelta(hours=CLINIC_HOURS[1])
+
+
+class ScheduleIndex:
+    """Interval index of booked slots per (resource, name, day).
+
+    Each bucket keeps its bookings in parallel lists sorted by start time.
+    Bookings on one vet or room never overlap, so the only booking that can
+    clash with [start, end) is the last one starting before end; bisect finds
+    it in O(log n) instead of scanning the day. Days are read from the
+    database on first use and kept current by AppointmentManager writes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._buckets = {}  # (resource, name, day) -> (starts, ends, appointment ids)
+        self._busy = {}  # (resource, name, day) -> booked seconds
+        self._days = set()  # days loaded from the database
+
+    def _load_day(self, conn, day):
+        if day in self._days:
+            return
+        cur = conn.cursor()
+        cur.execute("""SELECT appointment_id, start_time, end_time, vet, room FROM appointments
+                    WHERE start_time >= ? AND start_time < ? AND status != 'CANCELLED'""",
+                    (day, (datetime.fromisoformat(day) + timedelta(days=1)).date().isoformat()))
+        for appointment_id, start, end, vet, room in cur.fetchall():
+            self._insert(appointment_id, start, end, vet, room)
+        self._days.add(day)
+
+    def _insert(self, appointment_id, start, end, vet, room):
+        for resource, name in (("vet", vet), ("room", room)):
+            if name:
+                starts, ends, ids = self._buckets.setdefault((resource, name, start[:10]), ([], [], []))
+                i = bisect.bisect_right(starts, start)
+                starts.insert(i, start)
+                ends.insert(i, end)
+                ids.insert(i, appointment_id)
+                self._busy[(resource, name, start[:10])] = (self._busy.get((resource, name, start[:10]), 0)
+                                                            + self._seconds(start, end))
+
+    @staticmethod
+    def _seconds(start, end):
+        return (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+
+    def _clash(self, resource, name, start, end):
+        bucket = self._buckets.get((resource, name, start[:10]))
+        if bucket is None:
+            return None
+        starts, ends, ids = bucket
+        i = bisect.bisect_left(starts, end) - 1
+        if i >= 0 and ends[i] > start:
+            return (resource, name, ids[i], starts[i], ends[i])
+        return None
+
+    def conflicts(self, conn, start, end, vet=None, room=None):
+        """Bookings that overlap [start, end) on the vet or room"""
+        clashes = []
+        with self._lock:
+            self._load_day(conn, start[:10])
+            for resource, name in (("vet", vet), ("room", room)):
+                starts, ends, ids = self._buckets.get((resource, name, start[:10]), ((), (), ()))
+                # Ends are sorted too, so walk back until one ends before start
+                i = bisect.bisect_left(starts, end) - 1
+                while name and i >= 0 and ends[i] > start:
+                    clashes.append((resource, name, ids[i], starts[i], ends[i]))
+                    i -= 1
+        return clashes
+
+    def next_free(self, conn, minutes, vet=None, room=None, after=None, days=30):
+        """(start, end) of the earliest slot of the given length from after
+        (default now) when both the vet and the room are free, or None"""
+        length = timedelta(minutes=minutes)
+        start = after or datetime.now()
+        # Round up to the booking grid
+        grid = SLOT_MINUTES * 60
+        seconds = start.minute * 60 + start.second + (1 if start.microsecond else 0)
+        start = start.replace(minute=0, second=0, microsecond=0) + timedelta(seconds=-(-seconds // grid) * grid)
+        with self._lock:
+            for _ in range(days):
+                opens, closes = clinic_hours(start)
+                start = max(start, opens)
+                day = start.date().isoformat()
+                self._load_day(conn, day)
+                # Skip days without enough unbooked time left, without walking them
+                spare = (closes - opens - length).total_seconds()
+                if any(self._busy.get((resource, name, day), 0) > spare
+                       for resource, name in (("vet", vet), ("room", room)) if name):
+                    start = opens + timedelta(days=1)
+                    continue
+                while start + length <= closes:
+                    begin, finish = format_schedule_time(start), format_schedule_time(start + length)
+                    clashes = [clash for clash in (self._clash("vet", vet, begin, finish) if vet else None,
+                                                   self._clash("room", room, begin, finish) if room else None)
+                               if clash]
+                    if not clashes:
+                        return begin, finish
+                    # Jump past the latest-ending clash instead of stepping slot by slot
+                    start = datetime.fromisoformat(max(clash[4] for clash in clashes))
+                start = opens + timedelta(days=1)
+        return None
+
+    def add(self, appointment):
+        """Record a booked appointment (no-op for days not loaded yet)"""
+        if appointment.start_time is None:
+            return
+        with self._lock:
+            if appointment.start_time[:10] in self._days:
+                self._insert(appointment.appointment_id, appointment.start_time, appointment.end_time,
+                             appointment.vet, appointment.room)
+
+    def remove(self, appointment_id, start, vet=None, room=None):
+        """Free the slots of a cancelled or deleted appointment"""
+        if not start:
+            return
+        with self._lock:
+            for key in (("vet", vet, start[:10]), ("room", room, start[:10])):
+                if key not in self._buckets:
+                    continue
+                starts, ends, ids = self._buckets[key]
+                i = bisect.bisect_left(starts, start)
+                while i < len(starts) and starts[i] == start:
+                    if ids[i] == appointment_id:
+                        self._busy[key] -= self._seconds(starts[i], ends[i])
+                        del starts[i], ends[i], ids[i]
+                        break
+                    i += 1
+
+    def invalidate(self, day=None):
+        """Forget one day (or everything); it is re-read on next use"""
+        with self._lock:
+            if day is None:
+                self._buckets.clear()
+                self._busy.clear()
+                self._days.clear()
+                return
+            self._days.discard(day)
+            for key in [key for key in self._buckets if key[2] == day]:
+                del self._buckets[key]
+                del self._busy[key]
+
+
+SCHEDULE_INDEX = ScheduleIndex()
+
 
 class AppointmentManager:
     """Manages appointment operations"""
 
-    def __init__(self, db_connection):
+    QUERY_SELECT = ("appointment_id", "patient_name", "owner_name", "animal_type",
+                    "date", "notes", "status", "total_amount")
+    QUERY_COLUMNS = {name: name for name in ("id", "patient_id") + QUERY_SELECT}
+    QUERY_NULLABLE = frozenset(("patient_name", "owner_name", "animal_type", "notes"))
+
+    def __init__(self, db_connection, schedule=SCHEDULE_INDEX):
         self.db = db_connection
+        self.schedule = schedule
+
+    @staticmethod
+    def _check_slot(cur, start, end, vet, room):
+        """Raise ScheduleConflictError if [start, end) overlaps a live booking.
+
+        Bookings per vet/room never overlap, so only the latest one starting
+        before end can clash: one probe of the (vet|room, start_time) index.
+        """
+        conflicts = []
+        for resource, name in (("vet", vet), ("room", room)):
+            if not name:
+                continue
+            cur.execute(f"""SELECT appointment_id, start_time, end_time FROM appointments
+                         WHERE {resource} = ? AND start_time < ? AND status != 'CANCELLED'
+                         ORDER BY start_time DESC LIMIT 1""", (name, end))
+            row = cur.fetchone()
+            if row and row[2] > start:
+                conflicts.append((resource, name) + row)
+        if conflicts:
+            raise ScheduleConflictError(conflicts)
 
     def record_appointment(self, appointment):
-        """Record an appointment in the database - FIXED VERSION"""
+        """Record an appointment header with its service and consumable lines.
+
+        Everything is written in one transaction with one executemany per
+        table; consumables are taken from stock like a sale, so this raises
+        InsufficientStockError (with nothing written) when any is short, and
+        ScheduleConflictError when its slot is already taken.
+        """
+        def write(cur):
+            if appointment.start_time:
+                self._check_slot(cur, appointment.start_time, appointment.end_time,
+                                 appointment.vet, appointment.room)
+            if appointment.items:
+                InventoryManager(self.db).reserve_stock(appointment.items, cur)
+            if appointment.owner_name.strip() and appointment.patient_name.strip():
+                appointment.patient_id = PatientManager.register(cur, appointment.owner_name,
+                                                                 appointment.patient_name,
+                                                                 appointment.animal_type)
+            cur.execute("""INSERT INTO appointments 
+                        (appointment_id, patient_name, owner_name, animal_type, 
+                         date, notes, status, total_amount, start_time, end_time, vet, room,
+                         patient_id) 
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                        (appointment.appointment_id, appointment.patient_name, appointment.owner_name,
+                         appointment.animal_type, appointment.date, appointment.notes,
+                         appointment.status, appointment.total_amount, appointment.start_time,
+                         appointment.end_time, appointment.vet, appointment.room,
+                         appointment.patient_id))
+            cur.executemany("""INSERT INTO appointment_services 
+                            (appointment_id, service, qty, price, subtotal) 
+                            VALUES (?, ?, ?, ?, ?)""",
+                            [(appointment.appointment_id, service['service'], service['qty'],
+                              service['price'], service['subtotal']) for service in appointment.services])
+            cur.executemany("""INSERT INTO appointment_items 
+                            (appointment_id, item_id, item_name, quantity, price, subtotal) 
+                            VALUES (?, ?, ?, ?, ?, ?)""",
+                            [(appointment.appointment_id, item['id'], item['name'], item['qty'],
+                              item['price'], item['subtotal']) for item in appointment.items])
+            DailyMetrics.record_appointment(cur, appointment.date, appointment.status)
+
         try:
-            cur = self.db.cursor()
-            
-            # Check if appointments table exists
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='appointments'")
-            table_exists = cur.fetchone()
-            
-            if not table_exists:
-                # Create the appointments table with correct structure
-                cur.execute("""
-                    CREATE TABLE appointments(
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        appointment_id TEXT,
-                        patient_name TEXT,
-                        owner_name TEXT,
-                        animal_type TEXT,
-                        service TEXT,
-                        qty INTEGER,
-                        price REAL,
-                        subtotal REAL,
-                        date TEXT,
-                        notes TEXT,
-                        status TEXT,
-                        total_amount REAL
-                    )
-                """)
-                print("Created appointments table")
-            
-            # Record the appointment with services
-            for service in appointment.services:
-                cur.execute("""INSERT INTO appointments 
-                            (appointment_id, patient_name, owner_name, animal_type, service, 
-                             qty, price, subtotal, date, notes, status, total_amount) 
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                            (appointment.appointment_id, appointment.patient_name, appointment.owner_name,
-                             appointment.animal_type, service['service'], service['qty'], service['price'],
-                             service['subtotal'], appointment.date, appointment.notes, 
-                             appointment.status, appointment.total_amount))
-            
-            self.db.commit()
+            run_in_transaction(self.db, write)
+            if appointment.items:
+                INVENTORY_CACHE.refresh(self.db, [item['id'] for item in appointment.items])
+            if appointment.status != "CANCELLED":
+                self.schedule.add(appointment)
             print(f"Appointment {appointment.appointment_id} recorded successfully!")
             print(f"Total amount: {appointment.total_amount}")
             return True
+        except InsufficientStockError as e:
+            INVENTORY_CACHE.refresh(self.db, [shortage[0] for shortage in e.shortages])
+            raise
+        except ScheduleConflictError:
+            # Another terminal booked the slot; re-read the day on next use
+            self.schedule.invalidate(appointment.start_time[:10])
+            raise
         except sqlite3.Error as e:
             print(f"Error recording appointment: {e}")
-            self.db.rollback()
             return False
 
-    def get_appointments_history(self, date_filter="", appointment_filter=""):
-        """Get appointments history with optional filters"""
+    def next_free_slot(self, minutes=None, vet=None, room=None, after=None):
+        """(start, end) of the earliest slot where the vet and room are both free, or None"""
         try:
-            cur = self.db.cursor()
-            query = "SELECT * FROM appointments WHERE 1=1"
-            params = []
+            return self.schedule.next_free(self.db, minutes or SLOT_MINUTES, vet, room, after)
+        except sqlite3.Error as e:
+            print(f"Error finding a free slot: {e}")
+            return None
 
-            if date_filter:
-                query += " AND date LIKE ?"
-                params.append(f"{date_filter}%")
+    def slot_conflicts(self, start, end, vet=None, room=None):
+        """Bookings overlapping [start, end) on the vet or room"""
+        try:
+            return self.schedule.conflicts(self.db, start, end, vet, room)
+        except sqlite3.Error as e:
+            print(f"Error checking the schedule: {e}")
+            return []
 
-            if appointment_filter:
-                query += " AND appointment_id LIKE ?"
-                params.append(f"%{appointment_filter}%")
+    def get_appointment_slot(self, appointment_id):
+        """(start_time, end_time, vet, room) of an appointment, or None"""
+        try:
+            cur = self.db.cursor()
+            cur.execute("SELECT start_time, end_time, vet, room FROM appointments WHERE appointment_id = ?",
+                        (appointment_id,))
+            return cur.fetchone()
+        except sqlite3.Error as e:
+            print(f"Error getting appointment slot: {e}")
+            return None
 
-            query += " ORDER BY date DESC"
-            cur.execute(query, params)
-            return cur.fetchall()
+    def get_appointment_lines(self, appointment_id):
+        """Return (services, items) of an appointment: (service, qty, price, subtotal)
+        and (item_name, quantity, price, subtotal) rows"""
+        try:
+            cur = self.db.cursor()
+            cur.execute("""SELECT service, qty, price, subtotal FROM appointment_services
+                        WHERE appointment_id = ? ORDER BY id""", (appointment_id,))
+            services = cur.fetchall()
+            cur.execute("""SELECT item_name, quantity, price, subtotal FROM appointment_items
+                        WHERE appointment_id = ? ORDER BY id""", (appointment_id,))
+            return services, cur.fetchall()
         except sqlite3.Error as e:
-            print(f"Error getting appointments history: {e}")
-            return []
+            print(f"Error getting appointment lines: {e}")
+            return [], []
+
+    @staticmethod
+    def _history_bound(value):
+        if isinstance(value, datetime):
+            return format_schedule_time(value)
+        return value.isoformat() if hasattr(value, "isoformat") else value
+
+    def _history_pages(self, start, end, status, animal_type, owner_name, appointment_id,
+                       page_size, newest_first, patient_id=None):
+        """Pages of appointment header rows, keyset-paged on (date, appointment_id)"""
+        filters = {"date": [(operator, self._history_bound(value))
+                            for operator, value in ((">=", start), ("<", end)) if value]}
+        for name, value in (("status", status), ("animal_type", animal_type), ("owner_name", owner_name),
+                            ("patient_id", patient_id)):
+            if value:
+                filters[name] = value
+        if appointment_id:
+            filters["appointment_id"] = ("PREFIX", appointment_id)
+        sort = ("-date", "-appointment_id") if newest_first else ("date", "appointment_id")
+        source = self.pages(QuerySpec(filters=filters, sort=sort))
+
+        after = None
+        while True:
+            page = source.page(after, page_size)
+            if page:
+                yield [row for key, row in page]
+            if len(page) < page_size:
+                return
+            after = page[-1][0]
+
+    def iter_appointments(self, start=None, end=None, status=None, animal_type=None, owner_name=None,
+                          appointment_id=None, page_size=500, newest_first=True, patient_id=None):
+        """Yield appointment rows shaped like get_all_appointments() a page at a time.
+
+        start/end bound date as a half-open range [start, end) and accept
+        datetimes, dates or 'YYYY-MM-DD[ HH:MM:SS]' strings; status,
+        animal_type, owner_name and patient_id match exactly and
+        appointment_id matches a prefix. Each page is one index seek past the
+        previous page's (date, appointment_id), so nothing beyond one page is
+        held in memory.
+        """
+        for rows in self._history_pages(start, end, status, animal_type, owner_name, appointment_id,
+                                        page_size, newest_first, patient_id):
+            yield from rows
+
+    def iter_history(self, start=None, end=None, status=None, animal_type=None, owner_name=None,
+                     appointment_id=None, page_size=500, newest_first=True, patient_id=None):
+        """Yield history rows (one per service line, like get_appointments_history())
+        for the appointments iter_appointments() would yield with the same arguments"""
+        for rows in self._history_pages(start, end, status, animal_type, owner_name, appointment_id,
+                                        page_size, newest_first, patient_id):
+            ids = [row[0] for row in rows]
+            lines = {}
+            try:
+                cur = self.db.cursor()
+                cur.execute(f"""SELECT id, appointment_id, service, qty, price, subtotal
+                             FROM appointment_services WHERE appointment_id IN ({','.join('?' * len(ids))})
+                             ORDER BY id""", ids)
+                for line in cur.fetchall():
+                    lines.setdefault(line[1], []).append(line)
+            except sqlite3.Error as e:
+                print(f"Error getting appointments history: {e}")
+                return
+            for appointment_id, patient_name, owner_name, animal_type, date, notes, status, total_amount in rows:
+                for line_id, _, service, qty, price, subtotal in lines.get(appointment_id) or [(None,) * 6]:
+                    yield (line_id, appointment_id, patient_name, owner_name, animal_type, service, qty,
+                           price, subtotal, date, notes, status, total_amount)
+
+    def get_appointments_history(self, date_filter="", appointment_filter=""):
+        """Get appointments history (one row per service) with optional filters.
+
+        date_filter is a date prefix ('YYYY', 'YYYY-MM' or 'YYYY-MM-DD') and
+        appointment_filter an appointment id prefix; both become index ranges.
+        """
+        end = date_filter[:-1] + chr(ord(date_filter[-1]) + 1) if date_filter else None
+        return list(self.iter_history(date_filter or None, end, appointment_id=appointment_filter or None))
 
     def get_all_appointments(self):
-        """Get all unique appointments - FIXED VERSION"""
+        """Get all appointments, newest first"""
         try:
             cur = self.db.cursor()
             cur.execute("""
-                SELECT DISTINCT appointment_id, patient_name, owner_name, animal_type, 
+                SELECT appointment_id, patient_name, owner_name, animal_type, 
                        date, notes, status, total_amount
                 FROM appointments 
-                GROUP BY appointment_id 
                 ORDER BY date DESC
             """)
             return cur.fetchall()
@@ -358,78 +1317,282 @@ class AppointmentManager:
             print(f"Error getting appointments: {e}")
             return []
 
+    def appointment_pages(self):
+        """Rows shaped like get_all_appointments(), paged newest first"""
+        return self.pages()
+
+    def pages(self, spec=None):
+        """KeysetSource over appointment rows for a QuerySpec (see query())"""
+        return (spec or QuerySpec()).source(self.db, self.QUERY_COLUMNS, self.QUERY_SELECT,
+                                            "FROM appointments", (("id",), ("appointment_id",)),
+                                            ("-date", "-appointment_id"), self.QUERY_NULLABLE)
+
+    def query(self, spec):
+        """One page of appointment rows, shaped like get_all_appointments(), matching spec"""
+        return spec.fetch(self.pages(spec))
+
+    @staticmethod
+    def _consumables(cur, appointment_id):
+        """The appointment's consumable lines in reserve_stock() format.
+
+        Lines for items since deleted from inventory are left out; there is
+        no stock to take from or return to.
+        """
+        cur.execute("""SELECT ai.item_id, ai.quantity FROM appointment_items ai
+                    JOIN inventory i ON i.id = ai.item_id WHERE ai.appointment_id = ?""",
+                    (appointment_id,))
+        return [{'id': item_id, 'qty': quantity} for item_id, quantity in cur.fetchall()]
+
     def update_appointment_status(self, appointment_id, new_status):
-        """Update appointment status"""
-        try:
-            cur = self.db.cursor()
+        """Update appointment status.
+
+        Consumables stay taken from stock while the appointment is live:
+        cancelling puts them back and reinstating a cancelled appointment
+        takes them again, in the same transaction as the status change.
+        """
+        touched = []
+
+        def write(cur):
+            del touched[:]
+            cur.execute("""SELECT date, status, start_time, end_time, vet, room FROM appointments
+                        WHERE appointment_id = ?""", (appointment_id,))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            date, old_status, start, end, vet, room = row
+            inventory = InventoryManager(self.db)
+            if old_status == "CANCELLED" and new_status != "CANCELLED":
+                # Reinstating takes the slot and the consumables back, unless
+                # the slot has been rebooked or the stock sold meanwhile
+                if start:
+                    self._check_slot(cur, start, end, vet, room)
+                items = self._consumables(cur, appointment_id)
+                if items:
+                    inventory.reserve_stock(items, cur)
+                    touched.extend(item['id'] for item in items)
+            elif old_status != "CANCELLED" and new_status == "CANCELLED":
+                touched.extend(inventory.release_stock(self._consumables(cur, appointment_id), cur))
+
             cur.execute("UPDATE appointments SET status = ? WHERE appointment_id = ?", 
                        (new_status, appointment_id))
-            self.db.commit()
+            DailyMetrics.move_appointment_status(cur, date or "", old_status, new_status)
+            return row
+
+        try:
+            row = run_in_transaction(self.db, write)
+            if row is None:
+                return False
+            old_status, start, vet, room = row[1], row[2], row[4], row[5]
+            if touched:
+                INVENTORY_CACHE.refresh(self.db, touched)
+            if start and new_status == "CANCELLED":
+                self.schedule.remove(appointment_id, start, vet, room)
+            elif start and old_status == "CANCELLED":
+                self.schedule.invalidate(start[:10])
             return True
+        except ScheduleConflictError as e:
+            print(f"Cannot reinstate appointment: {e}")
+            return False
+        except InsufficientStockError as e:
+            print(f"Cannot reinstate appointment: {e}")
+            INVENTORY_CACHE.refresh(self.db, [shortage[0] for shortage in e.shortages])
+            return False
         except sqlite3.Error as e:
             print(f"Error updating appointment status: {e}")
             return False
 
     def delete_appointment(self, appointment_id):
-        """Delete an appointment"""
-        try:
-            cur = self.db.cursor()
+        """Delete an appointment, returning its consumables to stock unless it was cancelled"""
+        touched = []
+
+        def write(cur):
+            del touched[:]
+            cur.execute("""SELECT date, status, start_time, vet, room FROM appointments
+                        WHERE appointment_id = ?""", (appointment_id,))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            if row[1] != "CANCELLED":
+                # Cancelling already put them back; the CASCADE is about to drop the lines
+                touched.extend(InventoryManager(self.db).release_stock(
+                    self._consumables(cur, appointment_id), cur))
             cur.execute("DELETE FROM appointments WHERE appointment_id = ?", (appointment_id,))
-            self.db.commit()
+            DailyMetrics.record_appointment(cur, row[0] or "", row[1], count=-1)
+            return row
+
+        try:
+            row = run_in_transaction(self.db, write)
+            if row is None:
+                return False
+            if touched:
+                INVENTORY_CACHE.refresh(self.db, touched)
+            self.schedule.remove(appointment_id, *row[2:])
             return True
         except sqlite3.Error as e:
             print(f"Error deleting appointment: {e}")
             return False
 
 
-class ShoppingCart:
-    """Manages shopping cart operations for items"""
+class PatientManager:
+    """Registry of owners and their patients (pets).
 
-    def __init__(self):
-        self.items = []
+    Names are unique case-insensitively (per owner for patients) and every
+    appointment points at its patient, so a pet's visits are one range of
+    the (patient_id, date, appointment_id) index. Lookups take a name
+    prefix and read a range of the NOCASE name indexes.
+    """
 
-    def add_item(self, item_id, item_name, price, quantity=1, category=""):
-        """Add item to cart"""
-        for item in self.items:
-            if item.item_id == item_id:
-                item.quantity += quantity
-                return
+    def __init__(self, db_connection):
+        self.db = db_connection
 
-        new_item = CartItem(item_id, item_name, price, quantity, category)
-        self.items.append(new_item)
+    @staticmethod
+    def _prefix_range(prefix):
+        # NOCASE folds ASCII to lower case, so bound the range in lower case
+        low = "".join(c.lower() if c.isascii() else c for c in prefix.strip())
+        return low, low[:-1] + chr(ord(low[-1]) + 1)
+
+    @staticmethod
+    def register(cur, owner_name, patient_name, animal_type=""):
+        """Id of the owner's patient, adding the owner and patient if new
+        (and updating the patient's animal type when one is given)"""
+        owner_name, patient_name = owner_name.strip(), patient_name.strip()
+        cur.execute("INSERT INTO owners (name) VALUES (?) ON CONFLICT(name) DO NOTHING", (owner_name,))
+        cur.execute("SELECT id FROM owners WHERE name = ?", (owner_name,))
+        owner_id = cur.fetchone()[0]
+        cur.execute("""INSERT INTO patients (owner_id, name, animal_type) VALUES (?, ?, ?)
+                    ON CONFLICT(owner_id, name) DO UPDATE
+                    SET animal_type = COALESCE(NULLIF(excluded.animal_type, ''), animal_type)""",
+                    (owner_id, patient_name, animal_type or ""))
+        cur.execute("SELECT id FROM patients WHERE owner_id = ? AND name = ?", (owner_id, patient_name))
+        return cur.fetchone()[0]
+
+    def search_owners(self, prefix, limit=10):
+        """[(owner_id, name)] of owners whose name starts with prefix"""
+        if not prefix.strip():
+            return []
+        try:
+            cur = self.db.cursor()
+            cur.execute("SELECT id, name FROM owners WHERE name >= ? AND name < ? ORDER BY name LIMIT ?",
+                        self._prefix_range(prefix) + (limit,))
+            return cur.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error searching owners: {e}")
+            return []
+
+    def search_patients(self, prefix, owner_name=None, limit=10):
+        """[(patient_id, name, animal_type, owner_name)] of patients whose name
+        starts with prefix, optionally only those of one owner"""
+        if not prefix.strip() and not owner_name:
+            return []
+        try:
+            cur = self.db.cursor()
+            query = """SELECT p.id, p.name, p.animal_type, o.name
+                       FROM patients p JOIN owners o ON o.id = p.owner_id WHERE 1=1"""
+            params = []
+            if prefix.strip():
+                query += " AND p.name >= ? AND p.name < ?"
+                params.extend(self._prefix_range(prefix))
+            if owner_name:
+                query += " AND o.name = ?"
+                params.append(owner_name.strip())
+            cur.execute(query + " ORDER BY p.name, p.id LIMIT ?", params + [limit])
+            return cur.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error searching patients: {e}")
+            return []
+
+    def find_patient(self, owner_name, patient_name):
+        """Id of the named owner's patient, or None"""
+        try:
+            cur = self.db.cursor()
+            cur.execute("""SELECT p.id FROM patients p JOIN owners o ON o.id = p.owner_id
+                        WHERE o.name = ? AND p.name = ?""", (owner_name.strip(), patient_name.strip()))
+            row = cur.fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            print(f"Error finding patient: {e}")
+            return None
+
+
+class ShoppingCart:
+    """Manages shopping cart operations for items.
+
+    Lines are kept in a dict keyed by item id (in the order they were added)
+    and the total and item count are maintained as lines change, so every
+    operation is O(1) however many lines a wholesale order has.
+    """
+
+    def __init__(self):
+        self._lines = {}  # item_id -> CartItem
+        self._total = 0.0
+        self._count = 0
+
+    @property
+    def items(self):
+        """Cart lines in the order they were added"""
+        return list(self._lines.values())
+
+    def get(self, item_id):
+        """Cart line for item_id, or None"""
+        return self._lines.get(item_id)
+
+    def __len__(self):
+        return len(self._lines)
+
+    def add_item(self, item_id, item_name, price, quantity=1, category=""):
+        """Add item to cart"""
+        item = self._lines.get(item_id)
+        if item is None:
+            item = self._lines[item_id] = CartItem(item_id, item_name, price, 0, category)
+        item.quantity += quantity
+        self._total += item.price * quantity
+        self._count += quantity
+
+    def add_many(self, entries):
+        """Add (item_id, item_name, price[, quantity[, category]]) entries, e.g. a burst of scans"""
+        for entry in entries:
+            self.add_item(*entry)
 
     def remove_item(self, item_id):
         """Remove item from cart"""
-        self.items = [
-            item for item in self.items if item.item_id != item_id]
+        item = self._lines.pop(item_id, None)
+        if item is not None:
+            self._total -= item.subtotal
+            self._count -= item.quantity
+            if not self._lines:
+                self.clear()
 
     def update_quantity(self, item_id, quantity):
         """Update item quantity in cart"""
-        for item in self.items:
-            if item.item_id == item_id:
-                if quantity <= 0:
-                    self.remove_item(item_id)
-                else:
-                    item.quantity = quantity
-                return
+        item = self._lines.get(item_id)
+        if item is None:
+            return
+        if quantity <= 0:
+            self.remove_item(item_id)
+        else:
+            self._total += item.price * (quantity - item.quantity)
+            self._count += quantity - item.quantity
+            item.quantity = quantity
 
     def clear(self):
         """Clear all items from cart"""
-        self.items = []
+        self._lines = {}
+        self._total = 0.0
+        self._count = 0
 
     @property
     def total(self):
-        """Calculate total cart value"""
-        return sum(item.subtotal for item in self.items)
+        """Total cart value"""
+        return self._total
 
     @property
     def item_count(self):
-        """Get total number of items in cart"""
-        return sum(item.quantity for item in self.items)
+        """Total number of items in cart"""
+        return self._count
 
     def to_legacy_format(self):
         """Convert to legacy format for existing code"""
-        return [item.to_dict() for item in self.items]
+        return [item.to_dict() for item in self._lines.values()]
 
 
 class ReceiptManager:
@@ -491,62 +1654,441 @@ class ReceiptManager:
             print(f"Error saving receipt: {e}")
             return None
 
+class DailyMetrics:
+    """Per-day rollups (revenue, transactions, units sold per item, appointments
+    per status) kept in daily_metrics and updated in the same transaction as the
+    writes they summarize, so reports never re-aggregate the raw tables"""
+
+    REVENUE = "revenue"
+    TRANSACTIONS = "transactions"
+    UNITS_SOLD = "units_sold"      # keyed by item id
+    APPOINTMENTS = "appointments"  # keyed by status
+
+    @staticmethod
+    def bump_many(cur, rows):
+        """Add (day, metric, key, amount) deltas"""
+        cur.executemany("""INSERT INTO daily_metrics (day, metric, key, value)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(day, metric, key) DO UPDATE SET value = value + excluded.value""",
+                        rows)
+
+    @classmethod
+    def record_sale(cls, cur, sale_date, items, total_amount):
+        day = sale_date[:10]
+        rows = [(day, cls.REVENUE, "", total_amount), (day, cls.TRANSACTIONS, "", 1)]
+        rows.extend((day, cls.UNITS_SOLD, str(item['id']), item['qty']) for item in items)
+        cls.bump_many(cur, rows)
+
+    @classmethod
+    def record_appointment(cls, cur, date, status, count=1):
+        cls.bump_many(cur, [(date[:10], cls.APPOINTMENTS, status or "", count)])
+
+    @classmethod
+    def move_appointment_status(cls, cur, date, old_status, new_status):
+        cls.bump_many(cur, [(date[:10], cls.APPOINTMENTS, old_status or "", -1),
+                            (date[:10], cls.APPOINTMENTS, new_status or "", 1)])
+
+    @staticmethod
+    def totals(cur, metric, start_day=None, end_day=None):
+        """Return {key: value} for a metric, summed over an optional day range"""
+        query = "SELECT key, SUM(value) FROM daily_metrics WHERE metric = ?"
+        params = [metric]
+        if start_day:
+            query += " AND day >= ?"
+            params.append(start_day[:10])
+        if end_day:
+            query += " AND day <= ?"
+            params.append(end_day[:10])
+        cur.execute(query + " GROUP BY key", params)
+        return {key: value for key, value in cur.fetchall()}
+
+    @classmethod
+    def total(cls, cur, metric, start_day=None, end_day=None):
+        return sum(cls.totals(cur, metric, start_day, end_day).values())
+
+    @classmethod
+    def rebuild(cls, cur):
+        """Recompute every rollup from the raw tables"""
+        cur.execute("DELETE FROM daily_metrics")
+        cur.execute("""INSERT INTO daily_metrics (day, metric, key, value)
+                    SELECT substr(sale_date, 1, 10), ?, '', SUM(total_amount)
+                    FROM sales_transactions GROUP BY 1""", (cls.REVENUE,))
+        cur.execute("""INSERT INTO daily_metrics (day, metric, key, value)
+                    SELECT substr(sale_date, 1, 10), ?, '', COUNT(*)
+                    FROM sales_transactions GROUP BY 1""", (cls.TRANSACTIONS,))
+        cur.execute("""INSERT INTO daily_metrics (day, metric, key, value)
+                    SELECT substr(t.sale_date, 1, 10), ?, CAST(l.item_id AS TEXT), SUM(l.quantity)
+                    FROM sale_lines l JOIN sales_transactions t ON t.transaction_id = l.transaction_id
+                    GROUP BY 1, 3""", (cls.UNITS_SOLD,))
+        cur.execute("""INSERT INTO daily_metrics (day, metric, key, value)
+                    SELECT substr(date, 1, 10), ?, COALESCE(status, ''), COUNT(*)
+                    FROM appointments GROUP BY 1, 3""", (cls.APPOINTMENTS,))
+
+
+class DashboardStats:
+    """Dashboard counters gathered in a single query over indexed columns"""
+
+    def __init__(self, db_connection):
+        self.db = db_connection
+
+    def fetch(self, low_stock_threshold=None, day=None):
+        """Return total items, low-stock count, the day's and all appointments"""
+        if low_stock_threshold is None:
+            low_stock_threshold = LOW_STOCK_THRESHOLD
+        day = day or datetime.now().strftime('%Y-%m-%d')
+        next_day = (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+        stats = {"total_items": 0, "low_stock": 0, "today_appointments": 0, "total_appointments": 0}
+        try:
+            cur = self.db.cursor()
+            cur.execute("""SELECT
+                            (SELECT COUNT(*) FROM inventory),
+                            (SELECT COUNT(*) FROM inventory WHERE stock < ?),
+                            (SELECT COUNT(*) FROM appointments WHERE date >= ? AND date < ?),
+                            (SELECT COUNT(*) FROM appointments)""",
+                        (low_stock_threshold, day, next_day))
+            stats.update(zip(stats, cur.fetchone()))
+        except sqlite3.Error as e:
+            print(f"Error getting dashboard statistics: {e}")
+        return stats
+
+
 class SalesManager:
     """Manages sales and transactions"""
+
+    QUERY_COLUMNS = {
+        # transaction_id is read from the line (equal through the join) so that
+        # sorting on it follows idx_sale_lines_transaction_id
+        "line_id": "l.id", "transaction_id": "l.transaction_id", "item_id": "l.item_id",
+        "item_name": "l.item_name", "quantity": "l.quantity", "price": "l.price",
+        "subtotal": "l.subtotal", "total_amount": "t.total_amount",
+        "payment_method": "t.payment_method", "customer_name": "t.customer_name",
+        "sale_date": "t.sale_date"
+    }
+    QUERY_NULLABLE = frozenset(("item_id", "item_name", "payment_method", "customer_name"))
     
     def __init__(self, db_connection):
         self.db = db_connection
     
     def record_sale(self, transaction_id, items, total_amount, payment_method, customer_name=""):
-        """Record a sale transaction"""
-        try:
-            cur = self.db.cursor()
-            for item in items:
-                cur.execute("""INSERT INTO sales 
-                            (transaction_id, item_id, item_name, quantity, price, subtotal, 
-                             total_amount, payment_method, customer_name, sale_date) 
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                            (transaction_id, item['id'], item['name'], item['qty'], 
-                             item['price'], item['subtotal'], total_amount, payment_method,
-                             customer_name, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-            
-            # Update inventory stock
-            for item in items:
-                cur.execute("UPDATE inventory SET stock = stock - ? WHERE id = ?",
-                           (item['qty'], item['id']))
+        """Record a sale transaction header and its lines.
+
+        Runs as one BEGIN IMMEDIATE transaction (retried while another terminal
+        holds the write lock) that reserves the stock, so concurrent checkouts
+        can never oversell. Raises InsufficientStockError, with nothing
+        written, when any line is short.
+        """
+        def write(cur):
+            InventoryManager(self.db).reserve_stock(items, cur)
+            sale_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            cur.execute("""INSERT INTO sales_transactions 
+                        (transaction_id, total_amount, payment_method, customer_name, sale_date) 
+                        VALUES (?, ?, ?, ?, ?)""",
+                        (transaction_id, total_amount, payment_method, customer_name, sale_date))
+            cur.executemany("""INSERT INTO sale_lines 
+                            (transaction_id, item_id, item_name, quantity, price, subtotal) 
+                            VALUES (?, ?, ?, ?, ?, ?)""",
+                            [(transaction_id, item['id'], item['name'], item['qty'],
+                              item['price'], item['subtotal']) for item in items])
             
-            self.db.commit()
+            DailyMetrics.record_sale(cur, sale_date, items, total_amount)
+
+        try:
+            run_in_transaction(self.db, write)
+            INVENTORY_CACHE.refresh(self.db, [item['id'] for item in items])
             return True
+        except InsufficientStockError as e:
+            INVENTORY_CACHE.refresh(self.db, [shortage[0] for shortage in e.shortages])
+            raise
         except sqlite3.Error as e:
             print(f"Error recording sale: {e}")
             return False
     
     def get_sales_report(self, start_date=None, end_date=None):
-        """Get sales report for a date range"""
+        """Get sales lines for a date range.
+
+        Rows are (line_id, transaction_id, item_id, item_name, quantity, price,
+        subtotal, total_amount, payment_method, customer_name, sale_date).
+        """
         try:
             cur = self.db.cursor()
-            query = "SELECT * FROM sales WHERE 1=1"
+            query = """SELECT l.id, t.transaction_id, l.item_id, l.item_name, l.quantity, l.price,
+                              l.subtotal, t.total_amount, t.payment_method, t.customer_name, t.sale_date
+                       FROM sales_transactions t
+                       JOIN sale_lines l ON l.transaction_id = t.transaction_id
+                       WHERE 1=1"""
             params = []
             
             if start_date:
-                query += " AND sale_date >= ?"
+                query += " AND t.sale_date >= ?"
                 params.append(start_date)
             if end_date:
-                query += " AND sale_date <= ?"
+                query += " AND t.sale_date <= ?"
                 params.append(end_date)
             
-            query += " ORDER BY sale_date DESC"
+            query += " ORDER BY t.sale_date DESC, l.id"
             cur.execute(query, params)
             return cur.fetchall()
         except sqlite3.Error as e:
             print(f"Error getting sales report: {e}")
             return []
 
+    def sale_pages(self, start_date=None, end_date=None, sort=None):
+        """Rows shaped like get_sales_report(), paged newest first unless sorted otherwise"""
+        date_range = []
+        if start_date:
+            date_range.append((">=", start_date))
+        if end_date:
+            date_range.append(("<=", end_date))
+        return self.pages(QuerySpec(filters={"sale_date": date_range}, sort=sort))
+
+    def pages(self, spec=None):
+        """KeysetSource over sale lines for a QuerySpec (see query())"""
+        spec = spec or QuerySpec()
+        sort = spec.sort or ("-sale_date",)
+        if self.QUERY_COLUMNS[(sort if isinstance(sort, str) else sort[0]).lstrip("-")].startswith("l."):
+            # Walk the lines in the sort column's index and look each header up;
+            # CROSS JOIN stops SQLite from starting at the date range and sorting
+            from_sql = "FROM sale_lines l CROSS JOIN sales_transactions t ON t.transaction_id = l.transaction_id"
+        else:
+            from_sql = "FROM sales_transactions t JOIN sale_lines l ON l.transaction_id = t.transaction_id"
+        return spec.source(self.db, self.QUERY_COLUMNS, tuple(self.QUERY_COLUMNS), from_sql,
+                           (("line_id",),), ("-sale_date", "-line_id"), self.QUERY_NULLABLE)
+
+    def query(self, spec):
+        """One page of sale lines, shaped like get_sales_report(), matching spec"""
+        return spec.fetch(self.pages(spec))
+
+    def total_revenue(self, start_date=None, end_date=None):
+        """Sum of transaction totals, read from the header table's covering index"""
+        try:
+            cur = self.db.cursor()
+            query = "SELECT COALESCE(SUM(total_amount), 0) FROM sales_transactions WHERE 1=1"
+            params = []
+
+            if start_date:
+                query += " AND sale_date >= ?"
+                params.append(start_date)
+            if end_date:
+                query += " AND sale_date <= ?"
+                params.append(end_date)
+
+            cur.execute(query, params)
+            return cur.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error calculating revenue: {e}")
+            return 0.0
+
+class InventoryImporter:
+    """Streams supplier catalogs (CSV or JSON Lines) into the inventory"""
+
+    # Header spellings accepted besides the plain field names
+    FIELD_ALIASES = {
+        "item_name": "name",
+        "product": "name",
+        "qty": "stock",
+        "quantity": "stock",
+        "animal": "animal_type",
+        "expiration": "expiration_date",
+        "expiry": "expiration_date",
+    }
+    # Shelf-life strings like the catalogs use ("2 years", "6 months")
+    SHELF_LIFE_PATTERN = re.compile(r"^\d+\s+(day|week|month|year)s?$", re.IGNORECASE)
+    PROGRESS_EVERY = 500
+
+    def __init__(self, inventory_manager):
+        self.inventory_manager = inventory_manager
+        self.errors = []  # (line_number, message)
+
+    @staticmethod
+    def read_rows(path):
+        """Yield (line_number, raw_row) one row at a time: dicts for CSV files,
+        undecoded lines for JSON Lines files (.jsonl / .ndjson / .json).
+        Raises ValueError for a .json file holding one JSON array."""
+        if path.lower().endswith((".jsonl", ".ndjson", ".json")):
+            with open(path, encoding="utf-8") as f:
+                first = True
+                for line_number, line in enumerate(f, 1):
+                    if line.strip():
+                        if first and line.lstrip().startswith("["):
+                            raise ValueError(f"{os.path.basename(path)} is a JSON array; save it as "
+                                             "JSON Lines (one object per line) to import it")
+                        first = False
+                        yield line_number, line
+        else:
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                reader = csv.DictReader(f)
+                for row in reader:
+                    yield reader.line_num, row
+
+    @classmethod
+    def normalize_row(cls, raw_row):
+        """Turn a CSV dict or JSON line into a dict keyed by Medicine field names"""
+        if isinstance(raw_row, str):
+            raw_row = json.loads(raw_row)
+        if not isinstance(raw_row, dict):
+            raise ValueError("expected an object with named fields")
+
+        row = {}
+        for key, value in raw_row.items():
+            if key is None:
+                continue  # surplus CSV columns
+            field = str(key).strip().lower().replace(" ", "_")
+            row[cls.FIELD_ALIASES.get(field, field)] = value.strip() if isinstance(value, str) else value
+        return row
+
+    @classmethod
+    def validate_row(cls, row):
+        """Validate a normalized row and build a Medicine, or raise ValueError"""
+        name = str(row.get("name") or "").strip()
+        if not name:
+            raise ValueError("name is required")
+
+        price = row.get("price")
+        if price in (None, "") or not validate_number(str(price)):
+            raise ValueError(f"invalid price {price!r}")
+        price = float(price)
+        if not math.isfinite(price) or price < 0:
+            raise ValueError(f"invalid price {price!r}")
+
+        # Columns the file leaves out (or blank) stay None: an upsert keeps the
+        # existing value and a new row gets InventoryManager.INSERT_DEFAULTS
+        optional = {field: str(row[field]).strip() if row.get(field) not in (None, "") else None
+                    for field in ("brand", "animal_type", "dosage", "expiration_date")}
+
+        stock = row.get("stock")
+        if stock not in (None, ""):
+            if not validate_number(str(stock)) or not float(stock).is_integer() or float(stock) < 0:
+                raise ValueError(f"invalid stock {stock!r}")
+            stock = int(float(stock))
+        else:
+            stock = None
+
+        expiration_date = optional["expiration_date"]
+        if expiration_date and expiration_date.upper() != "N/A" \
+                and not cls.SHELF_LIFE_PATTERN.match(expiration_date):
+            try:
+                datetime.strptime(expiration_date, "%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"invalid expiration date {expiration_date!r}")
+
+        return Medicine(
+            name=name,
+            price=price,
+            stock=stock,
+            category=str(row.get("category") or "Supplies"),
+            **optional
+        )
+
+    def iter_medicines(self, path, progress_callback=None):
+        """Yield valid Medicines from the file, recording invalid rows in self.errors.
+        progress_callback(rows_read) is called every PROGRESS_EVERY rows and at the end."""
+        rows_read = 0
+        for line_number, raw_row in self.read_rows(path):
+            rows_read += 1
+            try:
+                yield self.validate_row(self.normalize_row(raw_row))
+            except ValueError as e:
+                self.errors.append((line_number, str(e)))
+            if progress_callback and rows_read % self.PROGRESS_EVERY == 0:
+                progress_callback(rows_read)
+        if progress_callback:
+            progress_callback(rows_read)
+
+    def import_file(self, path, progress_callback=None, chunk_size=InventoryManager.BULK_CHUNK_SIZE):
+        """Validate and bulk-upsert a supplier file in constant memory.
+        Returns the BulkLoadResult (None if rolled back); see self.errors for rejected rows."""
+        self.errors = []
+        return self.inventory_manager.upsert_items(
+            self.iter_medicines(path, progress_callback), chunk_size)
+
+class BackgroundQuery:
+    """Runs queries on a worker thread with its own connection.
+
+    Only the most recently submitted query matters: a newer submit interrupts
+    the one in flight, skips queued ones, and poll() drops superseded results.
+    query_func(conn, *args) runs on the worker; poll() is meant for the Tk
+    thread, which must not block on the database.
+    """
+
+    def __init__(self, query_func):
+        self.query_func = query_func
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._running = None
+        self._conn = None
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, *args):
+        """Queue a query, superseding any earlier one; returns its generation"""
+        generation = self.cancel()
+        self._requests.put((generation, args))
+        return generation
+
+    def cancel(self):
+        """Supersede any queued or running query; returns the new generation"""
+        with self._lock:
+            self._generation += 1
+            if self._running is not None and self._conn is not None:
+                self._conn.interrupt()
+            return self._generation
+
+    def is_current(self, generation):
+        return generation == self._generation
+
+    def poll(self):
+        """Return (generation, result, error) of the newest current result, or None"""
+        latest = None
+        while True:
+            try:
+                item = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if self.is_current(item[0]):
+                latest = item
+        return latest
+
+    def stop(self):
+        self._requests.put(None)
+
+    def _run(self):
+        self._conn = get_db()
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            generation, args = request
+            with self._lock:
+                if not self.is_current(generation):
+                    continue
+                self._running = generation
+            try:
+                result, error = self.query_func(self._conn, *args), None
+            except Exception as e:
+                result, error = None, e
+            with self._lock:
+                self._running = None
+            if self.is_current(generation):
+                self._results.put((generation, result, error))
+        close_db()
+
+
 # ==================== MAIN APPLICATION ====================
 
 APP_TITLE = "Veterinary Clinic Management System"
-DB_FILE = "vetclinic.db"
+DEFAULT_DB_FILE = "vetclinic.db"
+DB_FILE = os.environ.get("VETCLINIC_DB", DEFAULT_DB_FILE)
+# Throwaway databases for testing; never the clinic's real data
+TEST_DB_FILE = "vetclinic_test.db"
+MEMORY_DB = "file:vetclinic_memory?mode=memory&cache=shared"
 THEME_MODE = "dark"
+LOW_STOCK_THRESHOLD = 10
+# Search-as-you-type: wait this long after the last keystroke before querying
+SEARCH_DEBOUNCE_MS = 250
+SEARCH_POLL_MS = 30
 
 # Service prices for appointments - EXPANDED AND FIXED
 SERVICE_PRICES = {
@@ -564,8 +2106,104 @@ SERVICE_PRICES = {
     "Microchipping": 800.00
 }
 
+# Scheduling: bookable vets and rooms, opening hours and booking granularity
+CLINIC_VETS = ("Dr. Santos", "Dr. Reyes", "Dr. Cruz")
+CLINIC_ROOMS = ("Exam Room 1", "Exam Room 2", "Surgery Room")
+CLINIC_HOURS = (8, 17)  # open from 08:00 until 17:00
+SLOT_MINUTES = 30
+# Minutes a service takes; anything not listed takes one slot
+SERVICE_MINUTES = {
+    "Surgery": 120,
+    "Spay/Neuter": 90,
+    "Dental Cleaning": 60,
+    "X-Ray": 60,
+    "Emergency Care": 60
+}
+
+# Tuning applied to every connection the application opens
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",       # readers no longer block on the POS writer
+    "PRAGMA synchronous=NORMAL",     # fsync at checkpoints instead of every commit
+    "PRAGMA cache_size=-16000",      # ~16 MB page cache
+    "PRAGMA mmap_size=268435456",    # map up to 256 MB of the file
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+
+# Retries for a write transaction that still finds the database locked
+# after busy_timeout (e.g. several POS terminals checking out at once)
+BUSY_RETRIES = 8
+BUSY_BACKOFF = 0.02  # seconds before the first retry, doubled each time
+
+_thread_local = threading.local()
+
+def connect_db(path=None):
+    """Open a new tuned connection to the clinic database"""
+    path = path or DB_FILE
+    conn = sqlite3.connect(path, uri=path.startswith("file:"))
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def _is_busy(error):
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return "locked" in str(error) or "busy" in str(error)
+
+def run_in_transaction(conn, work, retries=BUSY_RETRIES):
+    """Run work(cur) inside BEGIN IMMEDIATE and commit, retrying when busy.
+
+    BEGIN IMMEDIATE takes the write lock before anything is read, so what
+    work reads cannot change under it. If another connection still holds the
+    lock after busy_timeout, the attempt is rolled back and retried with
+    exponential backoff and jitter. Returns work's result; any other error
+    rolls back and propagates.
+    """
+    for attempt in range(retries + 1):
+        cur = conn.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            result = work(cur)
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not _is_busy(e) or attempt == retries:
+                raise
+            time.sleep(BUSY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
 def get_db():
-    return sqlite3.connect(DB_FILE)
+    """Return this thread's shared connection, opening it on first use"""
+    connections = getattr(_thread_local, "connections", None)
+    if connections is None:
+        connections = _thread_local.connections = {}
+
+    conn = connections.get(DB_FILE)
+    if conn is None:
+        conn = connections[DB_FILE] = connect_db(DB_FILE)
+    return conn
+
+def close_db():
+    """Close this thread's shared connection (the next get_db() reopens it)"""
+    connections = getattr(_thread_local, "connections", {})
+    conn = connections.pop(DB_FILE, None)
+    if conn is not None:
+        conn.close()
+
+def use_database(path):
+    """Select the database file (or MEMORY_DB) used by get_db() from now on"""
+    global DB_FILE
+    DB_FILE = path
+    INVENTORY_CACHE.invalidate()
+    SCHEDULE_INDEX.invalidate()
+    ID_GENERATOR.reset()
 
 def apply_theme(window=None):
     ctk.set_appearance_mode(THEME_MODE)
@@ -576,11 +2214,89 @@ def apply_theme(window=None):
         except tk.TclError:
             pass
 
+def next_sequence(name, conn=None):
+    """Atomically take the next value of a named counter in id_sequences"""
+    conn = conn or get_db()
+
+    def bump(cur):
+        cur.execute("""INSERT INTO id_sequences (name, value) VALUES (?, 1)
+                    ON CONFLICT(name) DO UPDATE SET value = value + 1""", (name,))
+        cur.execute("SELECT value FROM id_sequences WHERE name = ?", (name,))
+        return cur.fetchone()[0]
+
+    return run_in_transaction(conn, bump)
+
+class IdGenerator:
+    """Time-ordered, collision-free ids in the Snowflake layout.
+
+    64 bits: milliseconds since EPOCH_MS (41), node (10) and a per-millisecond
+    sequence (12). Each process claims its node from the id_sequences table
+    when it first needs one (and again after a fork), so terminals sharing a
+    database never mint the same id. Ids render as a prefix and 16 hex digits,
+    so they also sort by creation time.
+    """
+
+    NODE_BITS = 10
+    SEQUENCE_BITS = 12
+    SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+    TIME_SHIFT = NODE_BITS + SEQUENCE_BITS
+    EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+
+    def __init__(self, node=None):
+        self._fixed_node = node
+        self._after_fork()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The child must not share the parent's node, nor a lock held at fork time
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the claimed node, e.g. after switching databases"""
+        with self._lock:
+            self._node = self._fixed_node
+            self._last_ms = -1
+            self._sequence = 0
+
+    def _claim_node(self):
+        try:
+            conn = connect_db()
+            try:
+                return next_sequence("id_node", conn) % (1 << self.NODE_BITS)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Error claiming an id node, using a random one: {e}")
+            return random.getrandbits(self.NODE_BITS)
+
+    def next_int(self):
+        with self._lock:
+            if self._node is None:
+                self._node = self._claim_node()
+
+            now = time.time_ns() // 1000000 - self.EPOCH_MS
+            if now > self._last_ms:
+                self._last_ms = now
+                self._sequence = 0
+            else:
+                # Same millisecond, or the clock stepped back: stay monotonic
+                self._sequence = (self._sequence + 1) & self.SEQUENCE_MASK
+                if not self._sequence:
+                    self._last_ms += 1
+            return (self._last_ms << self.TIME_SHIFT) | (self._node << self.SEQUENCE_BITS) | self._sequence
+
+    def next_id(self, prefix=""):
+        return f"{prefix}{self.next_int():016X}"
+
+ID_GENERATOR = IdGenerator()
+
 def generate_appointment_id():
-    return f"APT{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    return ID_GENERATOR.next_id("APT")
 
 def generate_transaction_id():
-    return f"TXN{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    return ID_GENERATOR.next_id("TXN")
 
 def validate_number(value: str) -> bool:
     try:
@@ -589,8 +2305,487 @@ def validate_number(value: str) -> bool:
     except ValueError:
         return False
 
+# ==================== SCHEMA MIGRATIONS ====================
+
+def _migrate_lookup_indexes(cur):
+    """Add secondary indexes for the columns used in WHERE / ORDER BY clauses"""
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_appointment_id ON appointments(appointment_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments(date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_status ON appointments(status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sales_transaction_id ON sales(transaction_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sales_sale_date ON sales(sale_date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_inventory_category_name ON inventory(category, name)")
+
+
+def _migrate_catalog_seed_tracking(cur):
+    """Key/value metadata table, used to tell when the catalog needs reseeding"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS app_meta(
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+
+
+def _create_appointment_tables(cur):
+    """Appointment header table plus one line-item row per service"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS appointments(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            appointment_id TEXT NOT NULL UNIQUE,
+            patient_name TEXT,
+            owner_name TEXT,
+            animal_type TEXT,
+            date TEXT,
+            notes TEXT,
+            status TEXT,
+            total_amount REAL
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS appointment_services(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            appointment_id TEXT NOT NULL
+                REFERENCES appointments(appointment_id) ON DELETE CASCADE ON UPDATE CASCADE,
+            service TEXT,
+            qty INTEGER,
+            price REAL,
+            subtotal REAL
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointment_services_appointment_id "
+                "ON appointment_services(appointment_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments(date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_status ON appointments(status)")
+
+def _migrate_appointment_services(cur):
+    """Split the one-row-per-service appointments table into a header table
+    and appointment_services line items"""
+    # The old indexes would follow the renamed table and block the new names
+    cur.execute("DROP INDEX IF EXISTS idx_appointments_appointment_id")
+    cur.execute("DROP INDEX IF EXISTS idx_appointments_date")
+    cur.execute("DROP INDEX IF EXISTS idx_appointments_status")
+    cur.execute("ALTER TABLE appointments RENAME TO appointments_legacy")
+
+    # Second-resolution APT%Y%m%d%H%M%S ids could be shared by two bookings made
+    # in the same second. Rows of one booking agree on patient, owner and date;
+    # any other booking under the same id keeps its rows under id-2, id-3, ...
+    cur.execute("""
+        SELECT appointment_id, patient_name, owner_name, date FROM appointments_legacy
+        WHERE appointment_id IN (
+            SELECT appointment_id FROM appointments_legacy WHERE appointment_id IS NOT NULL
+            GROUP BY appointment_id
+            HAVING COUNT(DISTINCT quote(patient_name) || quote(owner_name) || quote(date)) > 1)
+        GROUP BY appointment_id, patient_name, owner_name, date
+        ORDER BY appointment_id, MIN(id)
+    """)
+    collisions = cur.fetchall()
+    previous_id, suffix = None, 1
+    for appointment_id, patient_name, owner_name, date in collisions:
+        suffix = suffix + 1 if appointment_id == previous_id else 1
+        previous_id = appointment_id
+        if suffix == 1:
+            continue
+        new_id = f"{appointment_id}-{suffix}"
+        cur.execute("""UPDATE appointments_legacy SET appointment_id = ?
+                    WHERE appointment_id = ? AND patient_name IS ? AND owner_name IS ? AND date IS ?""",
+                    (new_id, appointment_id, patient_name, owner_name, date))
+        print(f"Appointment id {appointment_id} was shared by several bookings; "
+              f"{patient_name} ({owner_name}, {date}) is now {new_id}")
+
+    _create_appointment_tables(cur)
+
+    cur.execute("""
+        INSERT INTO appointments
+            (appointment_id, patient_name, owner_name, animal_type, date, notes, status, total_amount)
+        SELECT appointment_id, patient_name, owner_name, animal_type, date, notes, status, total_amount
+        FROM appointments_legacy
+        WHERE id IN (SELECT MIN(id) FROM appointments_legacy
+                     WHERE appointment_id IS NOT NULL GROUP BY appointment_id)
+    """)
+    cur.execute("""
+        INSERT INTO appointment_services (appointment_id, service, qty, price, subtotal)
+        SELECT appointment_id, service, qty, price, subtotal
+        FROM appointments_legacy
+        WHERE appointment_id IS NOT NULL
+        ORDER BY id
+    """)
+    cur.execute("DROP TABLE appointments_legacy")
+
+
+def _create_sales_tables(cur):
+    """Sales transaction header table plus one line-item row per product"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sales_transactions(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT NOT NULL UNIQUE,
+            total_amount REAL,
+            payment_method TEXT,
+            customer_name TEXT,
+            sale_date TEXT
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sale_lines(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT NOT NULL
+                REFERENCES sales_transactions(transaction_id) ON DELETE CASCADE ON UPDATE CASCADE,
+            item_id INTEGER,
+            item_name TEXT,
+            quantity INTEGER,
+            price REAL,
+            subtotal REAL
+        )
+    """)
+    # Covers both sale_date range filters and SUM(total_amount) without table lookups
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sales_transactions_sale_date "
+                "ON sales_transactions(sale_date, total_amount)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sale_lines_transaction_id ON sale_lines(transaction_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sale_lines_item_id ON sale_lines(item_id)")
+
+def _migrate_sales_transactions(cur):
+    """Split the one-row-per-line sales table into sales_transactions headers
+    and sale_lines, so each transaction total is stored exactly once"""
+    _create_sales_tables(cur)
+
+    # Second-resolution TXN%Y%m%d%H%M%S ids could be shared by two checkouts made
+    # in the same second. Lines of one checkout repeat its total, payment method,
+    # customer and date; any other checkout under the same id keeps its lines
+    # under id-2, id-3, ...
+    cur.execute("""
+        SELECT transaction_id, total_amount, payment_method, customer_name, sale_date FROM sales
+        WHERE transaction_id IN (
+            SELECT transaction_id FROM sales WHERE transaction_id IS NOT NULL
+            GROUP BY transaction_id
+            HAVING COUNT(DISTINCT quote(total_amount) || quote(payment_method) || quote(customer_name)
+                                  || quote(sale_date)) > 1)
+        GROUP BY transaction_id, total_amount, payment_method, customer_name, sale_date
+        ORDER BY transaction_id, MIN(id)
+    """)
+    collisions = cur.fetchall()
+    previous_id, suffix = None, 1
+    for transaction_id, total_amount, payment_method, customer_name, sale_date in collisions:
+        suffix = suffix + 1 if transaction_id == previous_id else 1
+        previous_id = transaction_id
+        if suffix == 1:
+            continue
+        new_id = f"{transaction_id}-{suffix}"
+        cur.execute("""UPDATE sales SET transaction_id = ?
+                    WHERE transaction_id = ? AND total_amount IS ? AND payment_method IS ?
+                      AND customer_name IS ? AND sale_date IS ?""",
+                    (new_id, transaction_id, total_amount, payment_method, customer_name, sale_date))
+        print(f"Transaction id {transaction_id} was shared by several checkouts; "
+              f"{total_amount} ({payment_method}, {customer_name or 'walk-in'}, {sale_date}) is now {new_id}")
+
+    cur.execute("""
+        INSERT INTO sales_transactions
+            (transaction_id, total_amount, payment_method, customer_name, sale_date)
+        SELECT transaction_id, total_amount, payment_method, customer_name, sale_date
+        FROM sales
+        WHERE id IN (SELECT MIN(id) FROM sales
+                     WHERE transaction_id IS NOT NULL GROUP BY transaction_id)
+    """)
+    cur.execute("""
+        INSERT INTO sale_lines (transaction_id, item_id, item_name, quantity, price, subtotal)
+        SELECT transaction_id, item_id, item_name, quantity, price, subtotal
+        FROM sales
+        WHERE transaction_id IS NOT NULL
+        ORDER BY id
+    """)
+    cur.execute("DROP TABLE sales")
+
+
+def _migrate_daily_metrics(cur):
+    """Rollup table read by the reports screen, seeded from existing history"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS daily_metrics(
+            day TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            key TEXT NOT NULL DEFAULT '',
+            value REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, metric, key)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_daily_metrics_metric ON daily_metrics(metric, day, key, value)")
+    DailyMetrics.rebuild(cur)
+
+
+def _migrate_stock_index(cur):
+    """Index for low-stock counts on the dashboard and reports"""
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_inventory_stock ON inventory(stock)")
+
+
+def _migrate_inventory_search(cur):
+    """FTS5 index over the searchable inventory columns, kept in sync by
+    triggers, plus a trigram index on names for typo-tolerant matching"""
+    try:
+        cur.execute("""
+            CREATE VIRTUAL TABLE inventory_fts USING fts5(
+                name, brand, category, animal_type, dosage,
+                content='inventory', content_rowid='id', prefix='2 3'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"FTS5 not available, inventory search stays on LIKE: {e}")
+        return
+
+    cur.execute("""
+        CREATE TRIGGER inventory_fts_insert AFTER INSERT ON inventory BEGIN
+            INSERT INTO inventory_fts(rowid, name, brand, category, animal_type, dosage)
+            VALUES (new.id, new.name, new.brand, new.category, new.animal_type, new.dosage);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER inventory_fts_delete AFTER DELETE ON inventory BEGIN
+            INSERT INTO inventory_fts(inventory_fts, rowid, name, brand, category, animal_type, dosage)
+            VALUES ('delete', old.id, old.name, old.brand, old.category, old.animal_type, old.dosage);
+        END
+    """)
+    # Only fires for edits to indexed columns, not for stock changes at checkout
+    cur.execute("""
+        CREATE TRIGGER inventory_fts_update
+        AFTER UPDATE OF name, brand, category, animal_type, dosage ON inventory BEGIN
+            INSERT INTO inventory_fts(inventory_fts, rowid, name, brand, category, animal_type, dosage)
+            VALUES ('delete', old.id, old.name, old.brand, old.category, old.animal_type, old.dosage);
+            INSERT INTO inventory_fts(rowid, name, brand, category, animal_type, dosage)
+            VALUES (new.id, new.name, new.brand, new.category, new.animal_type, new.dosage);
+        END
+    """)
+    cur.execute("INSERT INTO inventory_fts(inventory_fts) VALUES ('rebuild')")
+
+    try:
+        cur.execute("""
+            CREATE VIRTUAL TABLE inventory_trigram USING fts5(
+                name, content='inventory', content_rowid='id', tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"Trigram tokenizer not available, fuzzy search disabled: {e}")
+        return
+
+    cur.execute("""
+        CREATE TRIGGER inventory_trigram_insert AFTER INSERT ON inventory BEGIN
+            INSERT INTO inventory_trigram(rowid, name) VALUES (new.id, new.name);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER inventory_trigram_delete AFTER DELETE ON inventory BEGIN
+            INSERT INTO inventory_trigram(inventory_trigram, rowid, name) VALUES ('delete', old.id, old.name);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER inventory_trigram_update AFTER UPDATE OF name ON inventory BEGIN
+            INSERT INTO inventory_trigram(inventory_trigram, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO inventory_trigram(rowid, name) VALUES (new.id, new.name);
+        END
+    """)
+    cur.execute("INSERT INTO inventory_trigram(inventory_trigram) VALUES ('rebuild')")
+
+
+def _migrate_appointment_keyset_index(cur):
+    """Index matching the (date, appointment_id) paging key of the appointments
+    grid; it replaces the date-only index"""
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_date_id ON appointments(date, appointment_id)")
+    cur.execute("DROP INDEX IF EXISTS idx_appointments_date")
+
+
+def _migrate_sort_indexes(cur):
+    """Indexes behind the sortable grid columns; with the rowid tie-breaker
+    appended implicitly they serve (column, id) keyset pages directly"""
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_inventory_name ON inventory(name)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_inventory_price ON inventory(price)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_patient_name ON appointments(patient_name)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_owner_name ON appointments(owner_name)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_total_amount ON appointments(total_amount)")
+
+
+def _migrate_id_sequences(cur):
+    """Named counters; IdGenerator claims its node id here"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS id_sequences (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+
+
+def _migrate_appointment_items(cur):
+    """Consumable inventory items used during an appointment"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS appointment_items(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            appointment_id TEXT NOT NULL
+                REFERENCES appointments(appointment_id) ON DELETE CASCADE ON UPDATE CASCADE,
+            item_id INTEGER,
+            item_name TEXT,
+            quantity INTEGER,
+            price REAL,
+            subtotal REAL
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointment_items_appointment_id "
+                "ON appointment_items(appointment_id)")
+
+
+def _migrate_appointment_schedule(cur):
+    """Scheduled slot, vet and room of an appointment. The (vet|room, start_time)
+    indexes answer a conflict check with one probe; start_time loads a day"""
+    for column in ("start_time", "end_time", "vet", "room"):
+        cur.execute(f"ALTER TABLE appointments ADD COLUMN {column} TEXT")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_vet_start ON appointments(vet, start_time)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_room_start ON appointments(room, start_time)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_start ON appointments(start_time)")
+
+
+def _migrate_patient_registry(cur):
+    """owners and patients tables filled from the names on existing
+    appointments (trimmed, case-insensitive duplicates merged), and an
+    appointments.patient_id link indexed for per-patient history"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS owners(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL COLLATE NOCASE UNIQUE
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS patients(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            owner_id INTEGER NOT NULL REFERENCES owners(id),
+            name TEXT NOT NULL COLLATE NOCASE,
+            animal_type TEXT,
+            UNIQUE(owner_id, name)
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_patients_name ON patients(name)")
+    cur.execute("ALTER TABLE appointments ADD COLUMN patient_id INTEGER REFERENCES patients(id)")
+
+    # Newest visit first, so each patient keeps its latest animal type
+    cur.execute("""INSERT OR IGNORE INTO owners (name)
+                SELECT trim(owner_name) FROM appointments WHERE trim(owner_name) != ''
+                ORDER BY date DESC""")
+    cur.execute("""INSERT OR IGNORE INTO patients (owner_id, name, animal_type)
+                SELECT o.id, trim(a.patient_name), a.animal_type
+                FROM appointments a JOIN owners o ON o.name = trim(a.owner_name)
+                WHERE trim(a.patient_name) != ''
+                ORDER BY a.date DESC""")
+    cur.execute("""UPDATE appointments SET patient_id = (
+                    SELECT p.id FROM patients p JOIN owners o ON o.id = p.owner_id
+                    WHERE o.name = trim(appointments.owner_name)
+                      AND p.name = trim(appointments.patient_name))""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_patient_date "
+                "ON appointments(patient_id, date, appointment_id)")
+
+
+def _migrate_grid_sort_indexes(cur):
+    """Indexes behind the remaining sortable grid columns, on the
+    COALESCE(column, '') keys QuerySpec sorts nullable columns by; with the
+    rowid tie-breaker appended implicitly they serve keyset pages without a
+    sort step"""
+    cur.execute("DROP INDEX IF EXISTS idx_inventory_name")
+    for column in ("name", "brand", "animal_type", "expiration_date"):
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_inventory_{column}_sort "
+                    f"ON inventory(COALESCE({column}, ''))")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_inventory_category_name_sort "
+                "ON inventory(COALESCE(category, ''), COALESCE(name, ''))")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_animal_type_sort "
+                "ON appointments(COALESCE(animal_type, ''))")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sale_lines_item_name_sort ON sale_lines(COALESCE(item_name, ''))")
+    for column in ("quantity", "price", "subtotal"):
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_sale_lines_{column} ON sale_lines({column})")
+
+
+def _migrate_catalog_keys(cur):
+    """Seeded catalog rows get their own identity, inventory.catalog_key
+    (unique where set), in place of a unique (category, name) over all
+    inventory, so a same-named product from another brand can be added.
+
+    Each catalog item claims the oldest row with its category, name and
+    catalog brand; other rows sharing the name are left alone as separate
+    products and reported.
+    """
+    cur.execute("ALTER TABLE inventory ADD COLUMN catalog_key TEXT")
+    cur.execute("DROP INDEX IF EXISTS idx_inventory_category_name")
+    cur.execute("CREATE INDEX idx_inventory_category_name ON inventory(category, name)")
+    cur.execute("CREATE UNIQUE INDEX idx_inventory_catalog_key ON inventory(catalog_key) "
+                "WHERE catalog_key IS NOT NULL")
+
+    for row in catalog_seed_rows():
+        key, name, category, brand = row[0], row[1], row[4], row[5]
+        cur.execute("""UPDATE inventory SET catalog_key = ? WHERE id = (
+                        SELECT MIN(id) FROM inventory WHERE category = ? AND name = ? AND brand IS ?)""",
+                    (key, category, name, brand))
+        cur.execute("""SELECT id, brand FROM inventory
+                    WHERE category = ? AND name = ? AND catalog_key IS NOT ?""", (category, name, key))
+        for item_id, other_brand in cur.fetchall():
+            print(f"Inventory item {item_id} ({name}, {other_brand or 'no brand'}) shares its name with "
+                  f"catalog item {key}; kept as a separate product")
+
+
+def _migrate_nullable_sort_indexes(cur):
+    """Sorting by a nullable column keys on COALESCE(column, ''); index that
+    expression for the appointment name columns (owner_name keeps its plain
+    index for equality filters)"""
+    cur.execute("DROP INDEX IF EXISTS idx_appointments_patient_name")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_patient_name_sort "
+                "ON appointments(COALESCE(patient_name, ''))")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appointments_owner_name_sort "
+                "ON appointments(COALESCE(owner_name, ''))")
+
+
+# Ordered list of (version, migration). Each migration runs once, in its own
+# transaction, and bumps PRAGMA user_version so it is never applied twice.
+MIGRATIONS = [
+    (1, _migrate_lookup_indexes),
+    (2, _migrate_catalog_seed_tracking),
+    (3, _migrate_appointment_services),
+    (4, _migrate_sales_transactions),
+    (5, _migrate_daily_metrics),
+    (6, _migrate_stock_index),
+    (7, _migrate_inventory_search),
+    (8, _migrate_appointment_keyset_index),
+    (9, _migrate_sort_indexes),
+    (10, _migrate_id_sequences),
+    (11, _migrate_appointment_items),
+    (12, _migrate_appointment_schedule),
+    (13, _migrate_patient_registry),
+    (14, _migrate_nullable_sort_indexes),
+    (15, _migrate_catalog_keys),
+    (16, _migrate_grid_sort_indexes),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def run_migrations(conn):
+    """Apply pending schema migrations and return the resulting schema version"""
+    cur = conn.cursor()
+    cur.execute("PRAGMA user_version")
+    current_version = cur.fetchone()[0]
+
+    for version, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        try:
+            cur.execute("BEGIN")
+            migrate(cur)
+            cur.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        current_version = version
+        print(f"Applied schema migration {version}")
+
+    return current_version
+
 def clear_test_data():
-    """Clear any test appointment data that might exist"""
+    """Clear appointment data from the test database.
+
+    Only TEST_DB_FILE and MEMORY_DB are ever cleared; real clinic data is kept.
+    """
+    if DB_FILE not in (TEST_DB_FILE, MEMORY_DB):
+        print(f"Not clearing {DB_FILE}: test data is only cleared from the test database")
+        return False
+
     try:
         conn = get_db()
         cur = conn.cursor()
@@ -601,171 +2796,191 @@ def clear_test_data():
         
         if count > 0:
             cur.execute("DELETE FROM appointments")
+            cur.execute("DELETE FROM daily_metrics WHERE metric = ?", (DailyMetrics.APPOINTMENTS,))
             conn.commit()
+            SCHEDULE_INDEX.invalidate()
             print(f"Cleared {count} test appointments from database")
-        
-        conn.close()
+        return True
     except sqlite3.Error as e:
         print(f"Error clearing test data: {e}")
+        return False
 
-def init_db():
-    try:
-        conn = get_db()
-        cur = conn.cursor()
+def _create_base_schema(cur):
+    """Create the original tables and patch up pre-migration databases"""
+    # Users table - FIXED: Ensure role column exists
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            password TEXT,
+            role TEXT DEFAULT 'staff'
+        )
+        """
+    )
+
+    # Check if role column exists, if not add it
+    cur.execute("PRAGMA table_info(users)")
+    columns = [column[1] for column in cur.fetchall()]
+    if 'role' not in columns:
+        cur.execute("ALTER TABLE users ADD COLUMN role TEXT DEFAULT 'staff'")
+
+    # Inventory table
+    cur.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='inventory'"
+    )
+    inv_exists = cur.fetchone()
+
+    if not inv_exists:
+        cur.execute(
+            """
+            CREATE TABLE inventory(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                price REAL,
+                stock INTEGER,
+                category TEXT,
+                image TEXT,
+                brand TEXT,
+                animal_type TEXT,
+                dosage TEXT,
+                expiration_date TEXT
+            )
+            """
+        )
+    else:
+        cur.execute("PRAGMA table_info(inventory)")
+        cols = {row[1] for row in cur.fetchall()}
+        extra_cols = {
+            "brand": "ALTER TABLE inventory ADD COLUMN brand TEXT",
+            "animal_type": "ALTER TABLE inventory ADD COLUMN animal_type TEXT",
+            "dosage": "ALTER TABLE inventory ADD COLUMN dosage TEXT",
+            "expiration_date": "ALTER TABLE inventory ADD COLUMN expiration_date TEXT",
+        }
+        for col, sql in extra_cols.items():
+            if col not in cols:
+                try:
+                    cur.execute(sql)
+                except sqlite3.Error:
+                    pass  # Column might already exist
+
+    # Appointments table - FIXED: Added total_amount column
+    cur.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='appointments'"
+    )
+    apt_exists = cur.fetchone()
+
+    if not apt_exists:
+        cur.execute(
+            """
+            CREATE TABLE appointments(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                appointment_id TEXT,
+                patient_name TEXT,
+                owner_name TEXT,
+                animal_type TEXT,
+                service TEXT,
+                qty INTEGER,
+                price REAL,
+                subtotal REAL,
+                date TEXT,
+                notes TEXT,
+                status TEXT,
+                total_amount REAL
+            )
+            """
+        )
+    else:
+        # Check if total_amount column exists, if not add it
+        cur.execute("PRAGMA table_info(appointments)")
+        apt_columns = [column[1] for column in cur.fetchall()]
+        if 'total_amount' not in apt_columns:
+            cur.execute("ALTER TABLE appointments ADD COLUMN total_amount REAL")
 
-        # Users table - FIXED: Ensure role column exists
+    # Sales table
+    cur.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='sales'"
+    )
+    sales_exists = cur.fetchone()
+
+    if not sales_exists:
         cur.execute(
             """
-            CREATE TABLE IF NOT EXISTS users(
+            CREATE TABLE sales(
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE,
-                password TEXT,
-                role TEXT DEFAULT 'staff'
+                transaction_id TEXT,
+                item_id INTEGER,
+                item_name TEXT,
+                quantity INTEGER,
+                price REAL,
+                subtotal REAL,
+                total_amount REAL,
+                payment_method TEXT,
+                customer_name TEXT,
+                sale_date TEXT
             )
             """
         )
 
-        # Check if role column exists, if not add it
-        cur.execute("PRAGMA table_info(users)")
-        columns = [column[1] for column in cur.fetchall()]
-        if 'role' not in columns:
-            cur.execute("ALTER TABLE users ADD COLUMN role TEXT DEFAULT 'staff'")
-
-        # Inventory table
+def _ensure_default_users(cur):
+    """Make sure the default admin and staff accounts exist"""
+    # Insert default admin user - FIXED: Ensure proper user creation
+    default_username = "admin"
+    default_password = "admin123"
+    
+    # Check if admin user exists
+    cur.execute("SELECT * FROM users WHERE username = ?", (default_username,))
+    admin_exists = cur.fetchone()
+    
+    if not admin_exists:
         cur.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name='inventory'"
+            """
+            INSERT INTO users (username, password, role)
+            VALUES (?, ?, ?)
+            """,
+            (default_username, default_password, "admin"),
         )
-        inv_exists = cur.fetchone()
-
-        if not inv_exists:
-            cur.execute(
-                """
-                CREATE TABLE inventory(
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT,
-                    price REAL,
-                    stock INTEGER,
-                    category TEXT,
-                    image TEXT,
-                    brand TEXT,
-                    animal_type TEXT,
-                    dosage TEXT,
-                    expiration_date TEXT
-                )
-                """
-            )
-        else:
-            cur.execute("PRAGMA table_info(inventory)")
-            cols = {row[1] for row in cur.fetchall()}
-            extra_cols = {
-                "brand": "ALTER TABLE inventory ADD COLUMN brand TEXT",
-                "animal_type": "ALTER TABLE inventory ADD COLUMN animal_type TEXT",
-                "dosage": "ALTER TABLE inventory ADD COLUMN dosage TEXT",
-                "expiration_date": "ALTER TABLE inventory ADD COLUMN expiration_date TEXT",
-            }
-            for col, sql in extra_cols.items():
-                if col not in cols:
-                    try:
-                        cur.execute(sql)
-                    except sqlite3.Error:
-                        pass  # Column might already exist
 
-        # Appointments table - FIXED: Added total_amount column
+    # Insert default staff user
+    staff_username = "staff"
+    staff_password = "staff123"
+    
+    cur.execute("SELECT * FROM users WHERE username = ?", (staff_username,))
+    staff_exists = cur.fetchone()
+    
+    if not staff_exists:
         cur.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name='appointments'"
+            """
+            INSERT INTO users (username, password, role)
+            VALUES (?, ?, ?)
+            """,
+            (staff_username, staff_password, "staff"),
         )
-        apt_exists = cur.fetchone()
-
-        if not apt_exists:
-            cur.execute(
-                """
-                CREATE TABLE appointments(
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    appointment_id TEXT,
-                    patient_name TEXT,
-                    owner_name TEXT,
-                    animal_type TEXT,
-                    service TEXT,
-                    qty INTEGER,
-                    price REAL,
-                    subtotal REAL,
-                    date TEXT,
-                    notes TEXT,
-                    status TEXT,
-                    total_amount REAL
-                )
-                """
-            )
-        else:
-            # Check if total_amount column exists, if not add it
-            cur.execute("PRAGMA table_info(appointments)")
-            apt_columns = [column[1] for column in cur.fetchall()]
-            if 'total_amount' not in apt_columns:
-                cur.execute("ALTER TABLE appointments ADD COLUMN total_amount REAL")
 
-        # Sales table
-        cur.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name='sales'"
-        )
-        sales_exists = cur.fetchone()
-
-        if not sales_exists:
-            cur.execute(
-                """
-                CREATE TABLE sales(
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    transaction_id TEXT,
-                    item_id INTEGER,
-                    item_name TEXT,
-                    quantity INTEGER,
-                    price REAL,
-                    subtotal REAL,
-                    total_amount REAL,
-                    payment_method TEXT,
-                    customer_name TEXT,
-                    sale_date TEXT
-                )
-                """
-            )
+def init_db():
+    """Prepare the database for use.
 
-        # Insert default admin user - FIXED: Ensure proper user creation
-        default_username = "admin"
-        default_password = "admin123"
-        
-        # Check if admin user exists
-        cur.execute("SELECT * FROM users WHERE username = ?", (default_username,))
-        admin_exists = cur.fetchone()
-        
-        if not admin_exists:
-            cur.execute(
-                """
-                INSERT INTO users (username, password, role)
-                VALUES (?, ?, ?)
-                """,
-                (default_username, default_password, "admin"),
-            )
+    Fully migrated databases only get a schema version check and the default
+    user lookups, so start-up cost does not grow with the stored history.
+    """
+    try:
+        conn = get_db()
+        cur = conn.cursor()
 
-        # Insert default staff user
-        staff_username = "staff"
-        staff_password = "staff123"
-        
-        cur.execute("SELECT * FROM users WHERE username = ?", (staff_username,))
-        staff_exists = cur.fetchone()
-        
-        if not staff_exists:
-            cur.execute(
-                """
-                INSERT INTO users (username, password, role)
-                VALUES (?, ?, ?)
-                """,
-                (staff_username, staff_password, "staff"),
-            )
+        cur.execute("PRAGMA user_version")
+        schema_version = cur.fetchone()[0]
+        if schema_version < SCHEMA_VERSION:
+            # Later migrations reshape the original tables, so the base schema
+            # is only (re)checked on databases that predate them
+            if schema_version == 0:
+                _create_base_schema(cur)
+                conn.commit()
+
+            # Apply any pending schema migrations (indexes etc.)
+            run_migrations(conn)
 
+        _ensure_default_users(cur)
         conn.commit()
-        conn.close()
-        
-        # Clear any existing test data
-        clear_test_data()
         
         print("Database initialized successfully!")
 
@@ -774,6 +2989,21 @@ def init_db():
         messagebox.showerror(
             "Database Error", f"Database initialization failed: {str(e)}")
 
+def rebuild_daily_metrics():
+    """Recompute the daily_metrics rollups from the raw tables"""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+        DailyMetrics.rebuild(cur)
+        conn.commit()
+        print("Daily metrics rebuilt")
+        return True
+    except sqlite3.Error as e:
+        print(f"Error rebuilding daily metrics: {e}")
+        conn.rollback()
+        return False
+
 # ==================== COMPLETE CATALOGS ====================
 
 DOG_MEDICINES = {
@@ -851,70 +3081,77 @@ GROOM_SERVICES = {
 
 # ==================== CATALOG POPULATION FUNCTIONS ====================
 
-def populate_initial_inventory():
-    """Populate the database with initial inventory items"""
+# (catalog, inventory category, brand, initial stock) used when seeding
+CATALOG_SOURCES = [
+    (DOG_MEDICINES, "Dog Medicines", "Generic", 50),
+    (CAT_MEDICINES, "Cat Medicines", "Generic", 50),
+    (PET_FOODS, "Pet Food", "Premium", 30),
+]
+
+def catalog_seed_rows():
+    """Flatten the catalogs into inventory rows (catalog_key, name, price,
+    stock, category, brand, animal_type, dosage, expiration_date)"""
+    rows = []
+    for catalog, category, brand, stock in CATALOG_SOURCES:
+        for subcategories in catalog.values():
+            for products in subcategories.values():
+                for product_name, info in products.items():
+                    rows.append((f"{category}/{product_name}", product_name, info['price'], stock, category,
+                                 brand, info['animal_type'], info['dosage'], info['expiration']))
+    return rows
+
+def populate_initial_inventory(force=False):
+    """Seed catalog items into the inventory.
+
+    Only runs when the catalogs changed since the last seed (tracked by a hash
+    in app_meta), or when force is True. Catalog rows are matched on their
+    catalog_key, never on a user's same-named product. New catalog items are
+    inserted with their initial stock; existing ones only get their catalog
+    fields updated, so real stock levels are never touched.
+    """
     try:
         conn = get_db()
-        inventory_manager = InventoryManager(conn)
-        
-        # Clear existing inventory
         cur = conn.cursor()
-        cur.execute("DELETE FROM inventory")
-        
-        # Add dog medicines
-        for category, subcategories in DOG_MEDICINES.items():
-            for subcategory, medicines in subcategories.items():
-                for med_name, med_info in medicines.items():
-                    medicine = Medicine(
-                        name=med_name,
-                        price=med_info['price'],
-                        stock=50,
-                        category="Dog Medicines",
-                        brand="Generic",
-                        animal_type=med_info['animal_type'],
-                        dosage=med_info['dosage'],
-                        expiration_date=med_info['expiration']
-                    )
-                    inventory_manager.add_item(medicine)
-        
-        # Add cat medicines
-        for category, subcategories in CAT_MEDICINES.items():
-            for subcategory, medicines in subcategories.items():
-                for med_name, med_info in medicines.items():
-                    medicine = Medicine(
-                        name=med_name,
-                        price=med_info['price'],
-                        stock=50,
-                        category="Cat Medicines",
-                        brand="Generic",
-                        animal_type=med_info['animal_type'],
-                        dosage=med_info['dosage'],
-                        expiration_date=med_info['expiration']
-                    )
-                    inventory_manager.add_item(medicine)
-        
-        # Add pet foods
-        for category, subcategories in PET_FOODS.items():
-            for subcategory, foods in subcategories.items():
-                for food_name, food_info in foods.items():
-                    medicine = Medicine(
-                        name=food_name,
-                        price=food_info['price'],
-                        stock=30,
-                        category="Pet Food",
-                        brand="Premium",
-                        animal_type=food_info['animal_type'],
-                        dosage=food_info['dosage'],
-                        expiration_date=food_info['expiration']
-                    )
-                    inventory_manager.add_item(medicine)
-        
+
+        rows = catalog_seed_rows()
+        seed_hash = hashlib.sha1(json.dumps(rows).encode("utf-8")).hexdigest()
+
+        cur.execute("SELECT value FROM app_meta WHERE key = 'catalog_seed_hash'")
+        stored = cur.fetchone()
+        if not force and stored and stored[0] == seed_hash:
+            print("Catalog inventory is up to date")
+            return True
+
+        cur.execute("BEGIN")
+        cur.executemany("""INSERT INTO inventory
+                        (catalog_key, name, price, stock, category, brand, animal_type, dosage,
+                         expiration_date)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(catalog_key) WHERE catalog_key IS NOT NULL DO UPDATE SET
+                            price = excluded.price,
+                            brand = excluded.brand,
+                            animal_type = excluded.animal_type,
+                            dosage = excluded.dosage,
+                            expiration_date = excluded.expiration_date
+                        WHERE price IS NOT excluded.price
+                           OR brand IS NOT excluded.brand
+                           OR animal_type IS NOT excluded.animal_type
+                           OR dosage IS NOT excluded.dosage
+                           OR expiration_date IS NOT excluded.expiration_date""",
+                        rows)
+        changed = cur.rowcount
+        cur.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES ('catalog_seed_hash', ?)",
+                    (seed_hash,))
         conn.commit()
-        conn.close()
-        print("Initial inventory populated successfully!")
+        INVENTORY_CACHE.invalidate()
+        print(f"Catalog inventory seeded ({changed} of {len(rows)} catalog items added or updated)")
         return True
     except Exception as e:
         print(f"Error populating inventory: {e}")
+        try:
+            get_db().rollback()
+        except sqlite3.Error:
+            pass
         return False
 
 # ==================== MODERN UI COMPONENTS ====================
@@ -994,6 +3231,264 @@ class ColorfulCard(ctk.CTkFrame):
         )
         value_label.grid(row=1, column=0, padx=20, pady=(5, 15), sticky="w")
 
+class VirtualTreeview(ttk.Treeview):
+    """Treeview that only holds the rows currently on screen.
+
+    Rows come from a KeysetSource or RowSource and format_row turns a source
+    row into the displayed values. A fixed pool of items is created once and
+    rewritten as the window scrolls, so Tk never holds more rows than fit in
+    the widget however large the table is. Only slots whose values changed
+    are touched, so refresh() after an edit costs one page query plus the Tk
+    calls for the rows that actually differ. Attach a scrollbar as usual with
+    command=tree.yview and yscrollcommand=scrollbar.set.
+    """
+
+    def __init__(self, master, format_row=tuple, **kwargs):
+        self._yscrollcommand = kwargs.pop("yscrollcommand", None)
+        super().__init__(master, **kwargs)
+        self.format_row = format_row
+        self.source = RowSource([])
+        self._window = []  # (key, row) pairs on screen
+        self._anchor = None  # key just before the first row on screen
+        self._offset = 0  # position of the first row on screen
+        self._total = 0
+        self._capacity = int(self.cget("height"))
+        self._slots = []
+        self._slot_index = {}
+        self._shown = {}  # slot iid -> values it displays
+        self._attached = set()
+        self._selected_keys = set()
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.bind(sequence, self._on_wheel)
+        for sequence in ("<Up>", "<Down>", "<Prior>", "<Next>", "<Home>", "<End>"):
+            self.bind(sequence, self._on_key)
+        self.bind("<<TreeviewSelect>>", self._on_select, add="+")
+        self.bind("<Configure>", self._on_resize, add="+")
+
+    def configure(self, cnf=None, **kw):
+        if "yscrollcommand" in kw:
+            self._yscrollcommand = kw.pop("yscrollcommand")
+            self._update_scrollbar()
+            if cnf is None and not kw:
+                return None
+        return super().configure(cnf, **kw)
+
+    config = configure
+
+    def set_source(self, source):
+        """Show rows from source, starting at the top"""
+        self.source = source
+        self._selected_keys = set()
+        self._anchor = None
+        self._offset = 0
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the rows on screen, e.g. after the data changed"""
+        self._total = self.source.count()
+        self._window = self.source.page(self._anchor, self._capacity)
+        if len(self._window) < self._capacity and self._anchor is not None:
+            # Rows were removed near the end; pull earlier ones back in
+            self._seek(self._total)
+            return
+        self._offset = min(self._offset, max(0, self._total - len(self._window)))
+        self._render()
+
+    def enable_sorting(self, sort_columns, make_source):
+        """Sort on the server when a heading is clicked (click again to reverse).
+
+        sort_columns maps a heading to the QuerySpec sort columns it stands
+        for; make_source(sort) returns the source to show for that sort.
+        """
+        state = {"heading": None, "descending": False}
+
+        def sort_by(heading):
+            descending = state["heading"] == heading and not state["descending"]
+            state.update(heading=heading, descending=descending)
+            for other in sort_columns:
+                arrow = (" ▼" if descending else " ▲") if other == heading else ""
+                self.heading(other, text=other + arrow)
+            prefix = "-" if descending else ""
+            self.set_source(make_source(tuple(prefix + column for column in sort_columns[heading])))
+
+        for heading in sort_columns:
+            self.heading(heading, command=lambda heading=heading: sort_by(heading))
+
+    def selected_rows(self):
+        """Source rows of the selected items on screen"""
+        return [self._window[self._slot_index[iid]][1] for iid in self.selection()
+                if self._slot_index.get(iid, len(self._window)) < len(self._window)]
+
+    def scroll_rows(self, count):
+        """Move the window count rows down (up when negative)"""
+        if count > 0 and self._window:
+            more = self.source.page(self._window[-1][0], count)
+            if not more:
+                return
+            combined = self._window + more
+            shift = max(0, len(combined) - self._capacity)
+            if shift:
+                self._anchor = combined[shift - 1][0]
+            self._window = combined[shift:]
+            self._offset += shift
+        elif count < 0 and self._window and self._anchor is not None:
+            before = self.source.page(self._window[0][0], -count + 1, reverse=True)
+            rows = before[:-count]
+            self._anchor = before[-count][0] if len(before) > -count else None
+            self._window = (rows[::-1] + self._window)[:self._capacity]
+            self._offset = max(0, self._offset - len(rows))
+        else:
+            return
+        self._render()
+
+    def _seek(self, offset):
+        offset = max(0, min(offset, self._total - self._capacity))
+        self._anchor = self.source.key_at(offset)
+        self._window = self.source.page(self._anchor, self._capacity)
+        self._offset = offset
+        self._render()
+
+    def yview(self, *args):
+        if not args:
+            return self._fractions()
+        if args[0] == "moveto":
+            self._seek(int(float(args[1]) * self._total))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= max(1, self._capacity - 1)
+            self.scroll_rows(amount)
+
+    def yview_moveto(self, fraction):
+        self.yview("moveto", fraction)
+
+    def yview_scroll(self, number, what):
+        self.yview("scroll", number, what)
+
+    def _fractions(self):
+        if not self._total:
+            return (0.0, 1.0)
+        return (self._offset / self._total,
+                min(1.0, (self._offset + len(self._window)) / self._total))
+
+    def _update_scrollbar(self):
+        if self._yscrollcommand is not None:
+            self._yscrollcommand(*self._fractions())
+
+    def _render(self):
+        while len(self._slots) < min(self._capacity, len(self._window)):
+            iid = self.insert("", "end")
+            self._slot_index[iid] = len(self._slots)
+            self._slots.append(iid)
+            self._attached.add(iid)
+        selected = []
+        for index, iid in enumerate(self._slots):
+            if index < len(self._window):
+                key, row = self._window[index]
+                values = tuple(self.format_row(row))
+                if self._shown.get(iid) != values:
+                    self.item(iid, values=values)
+                    self._shown[iid] = values
+                if iid not in self._attached:
+                    self.move(iid, "", index)
+                    self._attached.add(iid)
+                if key in self._selected_keys:
+                    selected.append(iid)
+            elif iid in self._attached:
+                self.detach(iid)
+                self._attached.discard(iid)
+        if set(selected) != set(self.selection()):
+            self.selection_set(selected)
+        self._update_scrollbar()
+
+    def _on_select(self, event=None):
+        visible = {key for key, row in self._window}
+        chosen = {self._window[self._slot_index[iid]][0] for iid in self.selection()
+                  if self._slot_index.get(iid, len(self._window)) < len(self._window)}
+        self._selected_keys = (self._selected_keys - visible) | chosen
+
+    def _on_wheel(self, event):
+        self.scroll_rows(3 if event.num == 5 or event.delta < 0 else -3)
+        return "break"
+
+    def _on_key(self, event):
+        children = self.get_children()
+        focus = self.focus()
+        if event.keysym in ("Up", "Down"):
+            if not children or focus != children[-1 if event.keysym == "Down" else 0]:
+                return None
+            self._selected_keys = set()
+            self.scroll_rows(1 if event.keysym == "Down" else -1)
+            self.selection_set(focus)
+            self.focus(focus)
+        elif event.keysym in ("Next", "Prior"):
+            self.yview("scroll", 1 if event.keysym == "Next" else -1, "pages")
+        elif event.keysym == "Home":
+            self._seek(0)
+        else:
+            self._seek(self._total)
+        return "break"
+
+    def _on_resize(self, event):
+        if not self._window:
+            return
+        bbox = self.bbox(self._slots[0])
+        if not bbox:
+            return
+        capacity = max(1, (event.height - bbox[1]) // bbox[3])
+        if capacity != self._capacity:
+            self._capacity = capacity
+            self.refresh()
+
+class TreeReconciler:
+    """Keeps a plain Treeview in step with keyed rows.
+
+    Remembers which item shows which record, so sync() only inserts, updates,
+    moves or deletes the rows that changed and update() touches one row.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.iids = {}  # record key -> iid
+        self.keys = {}  # iid -> record key
+        self.values = {}  # iid -> values shown
+
+    def sync(self, rows):
+        """Make the tree show rows, an iterable of (key, values) in display order"""
+        rows = [(key, tuple(values)) for key, values in rows]
+        keys = {key for key, values in rows}
+        for key in [key for key in self.iids if key not in keys]:
+            self.delete(key)
+        for index, (key, values) in enumerate(rows):
+            iid = self.iids.get(key)
+            if iid is None:
+                self.iids[key] = iid = self.tree.insert("", index, values=values)
+                self.keys[iid] = key
+                self.values[iid] = values
+                continue
+            self.update(key, values)
+            if self.tree.index(iid) != index:
+                self.tree.move(iid, "", index)
+
+    def update(self, key, values):
+        """Show new values for one record (no-op when unchanged or absent)"""
+        iid = self.iids.get(key)
+        values = tuple(values)
+        if iid is not None and self.values[iid] != values:
+            self.tree.item(iid, values=values)
+            self.values[iid] = values
+
+    def delete(self, key):
+        iid = self.iids.pop(key, None)
+        if iid is not None:
+            del self.keys[iid]
+            del self.values[iid]
+            self.tree.delete(iid)
+
+    def key_of(self, iid):
+        """Record key shown by a tree item, or None"""
+        return self.keys.get(iid)
+
 # ==================== MAIN APPLICATION WINDOW ====================
 
 class VeterinaryClinicApp:
@@ -1009,13 +3504,14 @@ class VeterinaryClinicApp:
         # Initialize database FIRST
         print("Initializing database...")
         init_db()
-        print("Populating initial inventory...")
+        print("Checking catalog inventory...")
         populate_initial_inventory()
         
         # Initialize managers
         self.db = get_db()
         self.inventory_manager = InventoryManager(self.db)
         self.appointment_manager = AppointmentManager(self.db)
+        self.patient_manager = PatientManager(self.db)
         self.sales_manager = SalesManager(self.db)
         self.cart = ShoppingCart()
         self.current_user = None
@@ -1152,7 +3648,6 @@ class VeterinaryClinicApp:
             cur.execute("SELECT * FROM users WHERE username = ? AND password = ?", 
                        (username, password))
             user_data = cur.fetchone()
-            conn.close()
             
             if user_data:
                 # FIXED: Safe user data access
@@ -1217,34 +3712,14 @@ class VeterinaryClinicApp:
         stats_frame.grid(row=1, column=0, sticky="ew", padx=10, pady=10)
         stats_frame.grid_columnconfigure((0, 1, 2, 3), weight=1)
         
-        # Get actual statistics - FIXED: Count unique appointments
-        total_items = len(self.inventory_manager.get_all_items())
-        
-        # Get unique appointment counts
-        appointments = self.appointment_manager.get_all_appointments()
-        
-        # Count unique appointments by appointment_id
-        unique_appointments = set()
-        today_unique_appointments = set()
-        
-        for apt in appointments:
-            if len(apt) > 0 and apt[0]:  # appointment_id
-                unique_appointments.add(apt[0])
-                
-                # Check if it's today's appointment
-                if len(apt) > 4 and apt[4] and apt[4].startswith(datetime.now().strftime('%Y-%m-%d')):
-                    today_unique_appointments.add(apt[0])
-        
-        total_appointments_count = len(unique_appointments)
-        today_appointments_count = len(today_unique_appointments)
-        
-        low_stock = len([item for item in self.inventory_manager.get_all_items() if item.stock < 10])
+        # Get actual statistics in one round-trip
+        stats = DashboardStats(self.db).fetch()
         
         stats_data = [
-            ("Total Inventory", f"{total_items} items", COLORS["primary"]),
-            ("Today's Appointments", f"{today_appointments_count}", COLORS["success"]),
-            ("All Appointments", f"{total_appointments_count}", COLORS["secondary"]),
-            ("Low Stock Items", f"{low_stock}", COLORS["warning"])
+            ("Total Inventory", f"{stats['total_items']} items", COLORS["primary"]),
+            ("Today's Appointments", f"{stats['today_appointments']}", COLORS["success"]),
+            ("All Appointments", f"{stats['total_appointments']}", COLORS["secondary"]),
+            ("Low Stock Items", f"{stats['low_stock']}", COLORS["warning"])
         ]
         
         for i, (title, value, color) in enumerate(stats_data):
@@ -1332,7 +3807,8 @@ class VeterinaryClinicApp:
         
         # Create treeview for appointments
         columns = ("ID", "Patient", "Owner", "Animal", "Date", "Status", "Amount")
-        self.appointments_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
+        self.appointments_tree = VirtualTreeview(list_frame, format_row=self.appointment_row_values,
+                                                 columns=columns, show="headings", height=15)
         
         # Style the treeview
         style = ttk.Style()
@@ -1358,6 +3834,12 @@ class VeterinaryClinicApp:
             self.appointments_tree.heading(col, text=col)
             self.appointments_tree.column(col, width=column_widths.get(col, 100))
         
+        self.appointments_tree.enable_sorting(
+            {"ID": ("appointment_id",), "Patient": ("patient_name",), "Owner": ("owner_name",),
+             "Animal": ("animal_type",), "Date": ("date", "appointment_id"), "Status": ("status",),
+             "Amount": ("total_amount",)},
+            lambda sort: self.appointment_manager.pages(QuerySpec(sort=sort)))
+        
         # Add scrollbar
         scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.appointments_tree.yview)
         self.appointments_tree.configure(yscrollcommand=scrollbar.set)
@@ -1370,30 +3852,26 @@ class VeterinaryClinicApp:
     
     def load_appointments_data(self):
         """Load appointments data into the treeview"""
-        # Clear existing data
-        for item in self.appointments_tree.get_children():
-            self.appointments_tree.delete(item)
-        
-        # Get appointments
-        appointments = self.appointment_manager.get_all_appointments()
-        
-        # Populate treeview
-        for apt in appointments:
-            self.appointments_tree.insert("", "end", values=(
-                apt[0] if len(apt) > 0 else "",  # appointment_id
-                apt[1] if len(apt) > 1 else "",  # patient_name
-                apt[2] if len(apt) > 2 else "",  # owner_name
-                apt[3] if len(apt) > 3 else "",  # animal_type
-                apt[4] if len(apt) > 4 else "",  # date
-                apt[6] if len(apt) > 6 else "", # status
-                f"₱{apt[7]:.2f}" if len(apt) > 7 and apt[7] else "₱0.00"  # total_amount
-            ))
+        self.appointments_tree.set_source(self.appointment_manager.appointment_pages())
+
+    @staticmethod
+    def appointment_row_values(apt):
+        """Treeview values for a get_all_appointments() row"""
+        return (
+            apt[0],  # appointment_id
+            apt[1],  # patient_name
+            apt[2],  # owner_name
+            apt[3],  # animal_type
+            apt[4],  # date
+            apt[6],  # status
+            f"₱{apt[7]:.2f}" if apt[7] else "₱0.00"  # total_amount
+        )
     
     def create_new_appointment(self):
-        """Create a new appointment dialog with proper pricing - FIXED VERSION"""
+        """Create a new appointment dialog with any number of services and consumables"""
         dialog = ctk.CTkToplevel(self.root)
         dialog.title("New Appointment")
-        dialog.geometry("500x600")
+        dialog.geometry("620x900")
         dialog.transient(self.root)
         dialog.grab_set()
         dialog.configure(fg_color=COLORS["background"])
@@ -1405,15 +3883,18 @@ class VeterinaryClinicApp:
         # Form frame
         form_frame = ModernFrame(dialog)
         form_frame.pack(fill="both", expand=True, padx=20, pady=10)
+        form_frame.grid_columnconfigure(1, weight=1)
         
         # Form fields
         fields = [
-            ("Patient Name:", "entry"),
-            ("Owner Name:", "entry"),
+            ("Patient Name:", "combo", []),
+            ("Owner Name:", "combo", []),
             ("Animal Type:", "combo", ["Dog", "Cat", "Bird", "Other"]),
-            ("Service Type:", "combo", list(SERVICE_PRICES.keys())),
             ("Notes:", "text"),
-            ("Status:", "combo", ["SCHEDULED", "IN_PROGRESS", "COMPLETED", "CANCELLED"])
+            ("Status:", "combo", ["SCHEDULED", "IN_PROGRESS", "COMPLETED", "CANCELLED"]),
+            ("Vet:", "combo", ["", *CLINIC_VETS]),
+            ("Room:", "combo", ["", *CLINIC_ROOMS]),
+            ("Start (YYYY-MM-DD HH:MM):", "entry")
         ]
         
         entries = {}
@@ -1430,80 +3911,166 @@ class VeterinaryClinicApp:
                 combo = ctk.CTkComboBox(form_frame, values=field[2], width=300)
                 combo.grid(row=row, column=1, padx=10, pady=5, sticky="ew")
                 entries[field[0]] = combo
-                
-                # Add price display for service type
-                if field[0] == "Service Type:":
-                    price_label = ModernLabel(form_frame, text="Price: ₱0.00", 
-                                            text_color=COLORS["accent"])
-                    price_label.grid(row=row, column=2, padx=10, pady=5)
-                    
-                    def update_price(event=None):
-                        service = combo.get()
-                        price = SERVICE_PRICES.get(service, 0.0)
-                        price_label.configure(text=f"Price: ₱{price:.2f}")
-                    
-                    combo.configure(command=lambda e: update_price())
-                    # Set initial price
-                    update_price()
-                    
             elif field[1] == "text":
-                text_widget = ctk.CTkTextbox(form_frame, width=300, height=80)
+                text_widget = ctk.CTkTextbox(form_frame, width=300, height=60)
                 text_widget.grid(row=row, column=1, padx=10, pady=5, sticky="ew")
                 entries[field[0]] = text_widget
             
             row += 1
+        entries["Vet:"].set("")
+        entries["Room:"].set("")
+        
+        # Suggest registered patients and owners as their names are typed
+        patient_matches = {}  # dropdown text -> (patient_id, name, animal_type, owner_name)
+        pending_lookups = {}
+        
+        def suggest_names(field):
+            pending_lookups.pop(field, None)
+            typed = entries[field].get()
+            if field == "Owner Name:":
+                names = [name for owner_id, name in self.patient_manager.search_owners(typed)]
+            else:
+                patient_matches.clear()
+                for patient in self.patient_manager.search_patients(typed):
+                    patient_matches[f"{patient[1]} ({patient[3]})"] = patient
+                names = list(patient_matches)
+            entries[field].configure(values=names)
+        
+        def schedule_suggestions(field):
+            if field in pending_lookups:
+                dialog.after_cancel(pending_lookups[field])
+            pending_lookups[field] = dialog.after(SEARCH_DEBOUNCE_MS, lambda: suggest_names(field))
+        
+        def pick_patient(choice):
+            patient = patient_matches.get(choice)
+            if patient:
+                entries["Patient Name:"].set(patient[1])
+                entries["Owner Name:"].set(patient[3])
+                if patient[2]:
+                    entries["Animal Type:"].set(patient[2])
+        
+        for field in ("Patient Name:", "Owner Name:"):
+            entries[field].set("")
+            entries[field].bind("<KeyRelease>", lambda event, field=field: schedule_suggestions(field))
+        entries["Patient Name:"].configure(command=pick_patient)
+        
+        def find_free_slot():
+            vet, room = entries["Vet:"].get() or None, entries["Room:"].get() or None
+            if vet is None and room is None:
+                messagebox.showerror("Error", "Choose a vet or a room first")
+                return
+            minutes = sum(SERVICE_MINUTES.get(service, SLOT_MINUTES)
+                          for service, var in service_vars.items() if var.get()) or SLOT_MINUTES
+            slot = self.appointment_manager.next_free_slot(minutes, vet, room)
+            if slot is None:
+                messagebox.showinfo("Schedule", "No free slot in the next 30 days")
+                return
+            entries["Start (YYYY-MM-DD HH:MM):"].delete(0, "end")
+            entries["Start (YYYY-MM-DD HH:MM):"].insert(0, slot[0][:16])
+        
+        ModernButton(form_frame, text="🕒 Next Free Slot", width=140,
+                    command=find_free_slot).grid(row=row, column=1, padx=10, pady=5, sticky="w")
+        row += 1
+        
+        total_label = ModernLabel(form_frame, text="Total: ₱0.00", 
+                                 font=("Arial", 14, "bold"),
+                                 text_color=COLORS["accent"])
+        consumables = {}  # item id -> [Medicine, quantity]
+        
+        def update_total():
+            total = sum(SERVICE_PRICES[service] for service, var in service_vars.items() if var.get())
+            total += sum(medicine.price * quantity for medicine, quantity in consumables.values())
+            total_label.configure(text=f"Total: ₱{total:.2f}")
+        
+        # Services: tick as many as the visit needs
+        ModernLabel(form_frame, text="Services:").grid(row=row, column=0, sticky="nw", padx=10, pady=5)
+        services_frame = ctk.CTkScrollableFrame(form_frame, height=150)
+        services_frame.grid(row=row, column=1, padx=10, pady=5, sticky="ew")
+        service_vars = {}
+        for service, price in SERVICE_PRICES.items():
+            var = tk.BooleanVar(value=False)
+            ctk.CTkCheckBox(services_frame, text=f"{service}  (₱{price:.2f})", variable=var,
+                            command=update_total).pack(anchor="w", pady=2)
+            service_vars[service] = var
+        row += 1
+        
+        # Consumables: inventory items used during the visit
+        ModernLabel(form_frame, text="Items Used:").grid(row=row, column=0, sticky="nw", padx=10, pady=5)
+        items_frame = ModernFrame(form_frame)
+        items_frame.grid(row=row, column=1, padx=10, pady=5, sticky="ew")
+        items_frame.grid_columnconfigure(0, weight=1)
+        stock_items = {f"{item.name} ({item.category})": item
+                       for item in self.inventory_manager.get_all_items() if item.stock > 0}
+        item_combo = ctk.CTkComboBox(items_frame, values=list(stock_items) or [""], width=220)
+        item_combo.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
+        qty_entry = ModernEntry(items_frame, width=50)
+        qty_entry.insert(0, "1")
+        qty_entry.grid(row=0, column=1, padx=5, pady=5)
+        items_label = ModernLabel(items_frame, text="No items", justify="left")
+        items_label.grid(row=1, column=0, columnspan=3, padx=5, pady=5, sticky="w")
+        
+        def add_consumable():
+            medicine = stock_items.get(item_combo.get())
+            if medicine is None:
+                return
+            try:
+                quantity = int(qty_entry.get())
+            except ValueError:
+                quantity = 0
+            if quantity <= 0:
+                messagebox.showerror("Error", "Quantity must be a positive whole number")
+                return
+            line = consumables.setdefault(medicine.id, [medicine, 0])
+            line[1] += quantity
+            items_label.configure(text="\n".join(f"{medicine.name} x{quantity}"
+                                                 for medicine, quantity in consumables.values()))
+            update_total()
+        
+        ModernButton(items_frame, text="➕ Add", width=60,
+                    command=add_consumable).grid(row=0, column=2, padx=5, pady=5)
+        row += 1
+        
+        total_label.grid(row=row, column=1, padx=10, pady=10, sticky="e")
         
         # Submit button
         def submit_appointment():
             try:
-                # Get form values
-                patient_name = entries["Patient Name:"].get().strip()
-                owner_name = entries["Owner Name:"].get().strip()
-                animal_type = entries["Animal Type:"].get()
-                service_type = entries["Service Type:"].get()
-                notes = entries["Notes:"].get("1.0", "end-1c").strip() if hasattr(entries["Notes:"], 'get') else entries["Notes:"].get()
-                status = entries["Status:"].get()
-                
-                # Validate required fields
-                if not patient_name:
-                    messagebox.showerror("Error", "Patient name is required")
-                    return
-                if not owner_name:
-                    messagebox.showerror("Error", "Owner name is required")
-                    return
-                if not service_type:
-                    messagebox.showerror("Error", "Service type is required")
-                    return
-                
-                # Get service price
-                price = SERVICE_PRICES.get(service_type, 0.0)
-                
-                # Create appointment object
-                appointment = Appointment(
-                    appointment_id=generate_appointment_id(),
-                    patient_name=patient_name,
-                    owner_name=owner_name,
-                    animal_type=animal_type,
-                    service=service_type,
-                    notes=notes,
-                    status=status
+                builder = AppointmentBuilder(
+                    entries["Patient Name:"].get(),
+                    entries["Owner Name:"].get(),
+                    animal_type=entries["Animal Type:"].get(),
+                    notes=entries["Notes:"].get("1.0", "end-1c").strip(),
+                    status=entries["Status:"].get()
                 )
-                
-                # Add service with proper pricing
-                appointment.add_service(service_type, 1, price, price)
-                
-                print(f"Creating appointment: {appointment.appointment_id}")
-                print(f"Service: {service_type}, Price: {price}")
-                print(f"Total amount: {appointment.total_amount}")
-                
+                for service, var in service_vars.items():
+                    if var.get():
+                        builder.add_service(service)
+                for medicine, quantity in consumables.values():
+                    builder.add_item(medicine, quantity)
+                start = entries["Start (YYYY-MM-DD HH:MM):"].get().strip()
+                if start:
+                    builder.schedule(start, vet=entries["Vet:"].get(), room=entries["Room:"].get())
+                appointment = builder.build()
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            
+            try:
                 # Save to database
                 if self.appointment_manager.record_appointment(appointment):
                     messagebox.showinfo("Success", "Appointment created successfully!")
-                    self.load_appointments_data()
+                    self.appointments_tree.refresh()
                     dialog.destroy()
                 else:
                     messagebox.showerror("Error", "Failed to create appointment")
-                    
+            except InsufficientStockError as e:
+                messagebox.showerror("Error", "Not enough stock for:\n" + "\n".join(
+                    f"{name or item_id}: requested {requested}, available {available}"
+                    for item_id, name, requested, available in e.shortages))
+            except ScheduleConflictError as e:
+                messagebox.showerror("Error", "That slot is taken:\n" + "\n".join(
+                    f"{name}: {start[11:16]} - {end[11:16]} ({appointment_id})"
+                    for resource, name, appointment_id, start, end in e.conflicts))
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to create appointment: {str(e)}")
                 print(f"Appointment creation error: {e}")
@@ -1527,7 +4094,7 @@ class VeterinaryClinicApp:
         # Show appointment details in a colorful dialog
         details_window = ctk.CTkToplevel(self.root)
         details_window.title("Appointment Details")
-        details_window.geometry("400x300")
+        details_window.geometry("450x550")
         details_window.configure(fg_color=COLORS["background"])
         
         ModernLabel(details_window, text="📋 Appointment Details", 
@@ -1545,6 +4112,27 @@ class VeterinaryClinicApp:
         details_text += f"Status: {values[5]}\n"
         details_text += f"Amount: {values[6]}"
         
+        slot = self.appointment_manager.get_appointment_slot(values[0])
+        if slot and slot[0]:
+            start, end, vet, room = slot
+            details_text += f"\nScheduled: {start[:16]} - {end[11:16]}"
+            details_text += "".join(f", {name}" for name in (vet, room) if name)
+        
+        services, items = self.appointment_manager.get_appointment_lines(values[0])
+        for service, qty, price, subtotal in services:
+            details_text += f"\n  {service} x{qty}: ₱{subtotal:.2f}"
+        for item_name, quantity, price, subtotal in items:
+            details_text += f"\n  {item_name} x{quantity}: ₱{subtotal:.2f}"
+        
+        patient_id = self.patient_manager.find_patient(str(values[2]), str(values[1]))
+        if patient_id is not None:
+            visits = self.appointment_manager.iter_appointments(patient_id=patient_id, page_size=6)
+            previous = [visit for visit in itertools.islice(visits, 6) if visit[0] != values[0]][:5]
+            if previous:
+                details_text += "\nPrevious visits:"
+                for visit in previous:
+                    details_text += f"\n  {visit[4][:10]}  {visit[0]}  {visit[6]}"
+        
         details_label = ModernLabel(details_frame, text=details_text,
                                    font=("Arial", 12),
                                    justify="left")
@@ -1552,14 +4140,12 @@ class VeterinaryClinicApp:
     
     def update_appointment_status(self):
         """Update appointment status"""
-        selection = self.appointments_tree.selection()
-        if not selection:
+        rows = self.appointments_tree.selected_rows()
+        if not rows:
             messagebox.showwarning("Warning", "Please select an appointment to update")
             return
         
-        item = self.appointments_tree.item(selection[0])
-        values = item['values']
-        appointment_id = values[0]
+        appointment_id, status = rows[0][0], rows[0][6]
         
         # Status selection dialog
         status_dialog = ctk.CTkToplevel(self.root)
@@ -1573,7 +4159,7 @@ class VeterinaryClinicApp:
                    font=("Arial", 16, "bold"),
                    text_color=COLORS["accent"]).pack(pady=20)
         
-        status_var = ctk.StringVar(value=values[5])
+        status_var = ctk.StringVar(value=status)
         status_combo = ctk.CTkComboBox(status_dialog, 
                                       values=["SCHEDULED", "IN_PROGRESS", "COMPLETED", "CANCELLED"],
                                       variable=status_var)
@@ -1583,7 +4169,7 @@ class VeterinaryClinicApp:
             new_status = status_var.get()
             if self.appointment_manager.update_appointment_status(appointment_id, new_status):
                 messagebox.showinfo("Success", "Status updated successfully!")
-                self.load_appointments_data()
+                self.appointments_tree.refresh()
                 status_dialog.destroy()
             else:
                 messagebox.showerror("Error", "Failed to update status")
@@ -1595,14 +4181,12 @@ class VeterinaryClinicApp:
     
     def delete_appointment(self):
         """Delete selected appointment"""
-        selection = self.appointments_tree.selection()
-        if not selection:
+        rows = self.appointments_tree.selected_rows()
+        if not rows:
             messagebox.showwarning("Warning", "Please select an appointment to delete")
             return
         
-        item = self.appointments_tree.item(selection[0])
-        values = item['values']
-        appointment_id = values[0]
+        appointment_id = rows[0][0]
         
         # Confirmation dialog
         result = messagebox.askyesno("Confirm Delete", 
@@ -1611,7 +4195,7 @@ class VeterinaryClinicApp:
         if result:
             if self.appointment_manager.delete_appointment(appointment_id):
                 messagebox.showinfo("Success", "Appointment deleted successfully!")
-                self.load_appointments_data()
+                self.appointments_tree.refresh()
             else:
                 messagebox.showerror("Error", "Failed to delete appointment")
 
@@ -1645,6 +4229,8 @@ class VeterinaryClinicApp:
         ModernLabel(controls_frame, text="Search:").grid(row=0, column=0, padx=10, pady=10)
         self.search_entry = ModernEntry(controls_frame, placeholder_text="Search items...")
         self.search_entry.grid(row=0, column=1, padx=10, pady=10, sticky="ew")
+        self.search_entry.bind("<KeyRelease>", self.schedule_inventory_search)
+        self.search_entry.bind("<Return>", lambda e: self.search_inventory())
         
         # Search button
         search_btn = ModernButton(controls_frame, text="🔍 Search", 
@@ -1654,7 +4240,7 @@ class VeterinaryClinicApp:
         # Action buttons frame
         action_frame = ModernFrame(parent)
         action_frame.grid(row=2, column=0, sticky="ew", padx=10, pady=10)
-        action_frame.grid_columnconfigure((0, 1, 2, 3), weight=1)
+        action_frame.grid_columnconfigure((0, 1, 2, 3, 4), weight=1)
         
         # Action buttons
         add_btn = ModernButton(action_frame, text="➕ Add Item", 
@@ -1676,6 +4262,11 @@ class VeterinaryClinicApp:
                                   command=self.load_inventory_data)
         refresh_btn.grid(row=0, column=3, padx=10, pady=10, sticky="ew")
         
+        import_btn = ModernButton(action_frame, text="📥 Import", 
+                                 command=self.import_inventory_file,
+                                 fg_color=COLORS["secondary"])
+        import_btn.grid(row=0, column=4, padx=10, pady=10, sticky="ew")
+        
         # Inventory list frame
         list_frame = ModernFrame(parent)
         list_frame.grid(row=3, column=0, sticky="nsew", padx=10, pady=10)
@@ -1684,7 +4275,8 @@ class VeterinaryClinicApp:
         
         # Create treeview for inventory
         columns = ("ID", "Name", "Price", "Stock", "Category", "Brand", "Animal Type", "Expiration")
-        self.inventory_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
+        self.inventory_tree = VirtualTreeview(list_frame, format_row=self.inventory_row_values,
+                                              columns=columns, show="headings", height=15)
         
         # Style the treeview
         style = ttk.Style()
@@ -1710,6 +4302,12 @@ class VeterinaryClinicApp:
             self.inventory_tree.heading(col, text=col)
             self.inventory_tree.column(col, width=column_widths.get(col, 100))
         
+        self.inventory_tree.enable_sorting(
+            {"ID": ("id",), "Name": ("name",), "Price": ("price",), "Stock": ("stock",),
+             "Category": ("category", "name"), "Brand": ("brand",), "Animal Type": ("animal_type",),
+             "Expiration": ("expiration_date",)},
+            self.sorted_inventory_source)
+        
         # Add scrollbar
         scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.inventory_tree.yview)
         self.inventory_tree.configure(yscrollcommand=scrollbar.set)
@@ -1722,52 +4320,140 @@ class VeterinaryClinicApp:
 
     def load_inventory_data(self):
         """Load inventory data into the treeview"""
-        # Clear existing data
-        for item in self.inventory_tree.get_children():
-            self.inventory_tree.delete(item)
-        
-        # Get inventory items
-        items = self.inventory_manager.get_all_items()
-        
-        # Populate treeview
-        for item in items:
-            self.inventory_tree.insert("", "end", values=(
-                item.id,
-                item.name,
-                f"₱{item.price:.2f}",
-                item.stock,
-                item.category,
-                item.brand,
-                item.animal_type,
-                item.expiration_date
-            ))
+        self.inventory_tree.set_source(self.inventory_manager.item_pages())
+
+    def refresh_inventory_view(self):
+        """Bring the inventory treeview up to date after an edit, keeping its scroll position"""
+        if isinstance(self.inventory_tree.source, KeysetSource):
+            self.inventory_tree.refresh()
+        else:
+            # Showing search results: run the search again
+            self.search_inventory()
+
+    def sorted_inventory_source(self, sort):
+        """Inventory treeview source for a heading sort"""
+        source = self.inventory_tree.source
+        if not isinstance(source, RowSource):
+            return self.inventory_manager.pages(QuerySpec(sort=sort))
+        # Search results are already in memory
+        index = list(InventoryManager.QUERY_COLUMNS).index(sort[0].lstrip("-"))
+        return RowSource(sorted(source.rows, key=lambda row: (row[index] is None, row[index]),
+                                reverse=sort[0].startswith("-")))
+
+    def fill_inventory_tree(self, items):
+        """Show the given items (e.g. search results) in the inventory treeview"""
+        self.inventory_tree.set_source(RowSource(
+            (item.id, item.name, item.price, item.stock, item.category, item.brand,
+             item.animal_type, item.dosage, item.expiration_date) for item in items))
+
+    @staticmethod
+    def inventory_row_values(row):
+        """Treeview values for an item_pages() row"""
+        item_id, name, price, stock, category, brand, animal_type, dosage, expiration_date = row
+        return (item_id, name, f"₱{price:.2f}", stock, category, brand, animal_type, expiration_date)
+
+    def schedule_inventory_search(self, event=None):
+        """Debounce keystrokes: (re)start the timer for an incremental search"""
+        if event is not None and event.keysym == "Return":
+            return
+        if getattr(self, "_search_after_id", None):
+            self.root.after_cancel(self._search_after_id)
+        self._search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self.search_inventory)
 
     def search_inventory(self):
-        """Search inventory items"""
+        """Search inventory items on the background worker"""
+        if getattr(self, "_search_after_id", None):
+            self.root.after_cancel(self._search_after_id)
+        self._search_after_id = None
+        
         search_term = self.search_entry.get().strip()
         if not search_term:
+            # Back to the full, keyset-paged listing; drop any search in flight
+            if getattr(self, "inventory_search", None) is not None:
+                self.inventory_search.cancel()
+            self._search_generation = None
             self.load_inventory_data()
             return
         
-        # Clear existing data
-        for item in self.inventory_tree.get_children():
-            self.inventory_tree.delete(item)
+        if getattr(self, "inventory_search", None) is None:
+            self.inventory_search = BackgroundQuery(
+                lambda conn, search_term: InventoryManager(conn).search_items(search_term))
         
-        # Search items
-        items = self.inventory_manager.search_items(search_term)
+        self._search_generation = self.inventory_search.submit(search_term)
+        if not getattr(self, "_search_polling", False):
+            self._search_polling = True
+            self.root.after(SEARCH_POLL_MS, self.poll_inventory_search)
+
+    def poll_inventory_search(self):
+        """Show the latest search results once the worker delivers them"""
+        try:
+            if not self.inventory_tree.winfo_exists():
+                self._search_polling = False
+                return
+        except tk.TclError:
+            self._search_polling = False
+            return
         
-        # Populate treeview with search results
-        for item in items:
-            self.inventory_tree.insert("", "end", values=(
-                item.id,
-                item.name,
-                f"₱{item.price:.2f}",
-                item.stock,
-                item.category,
-                item.brand,
-                item.animal_type,
-                item.expiration_date
-            ))
+        if not self.inventory_search.is_current(self._search_generation):
+            # Cancelled: the search box was cleared
+            self._search_polling = False
+            return
+        
+        latest = self.inventory_search.poll()
+        if latest is not None:
+            generation, items, error = latest
+            if error is not None:
+                print(f"Inventory search error: {error}")
+            else:
+                self.fill_inventory_tree(items)
+            if generation == self._search_generation:
+                self._search_polling = False
+                return
+        self.root.after(SEARCH_POLL_MS, self.poll_inventory_search)
+
+    def import_inventory_file(self):
+        """Import a supplier catalog (CSV or JSON Lines) into the inventory"""
+        filename = filedialog.askopenfilename(
+            filetypes=[("Catalog files", "*.csv *.jsonl *.ndjson *.json"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        
+        # Progress dialog fed by the importer's progress callback
+        progress_dialog = ctk.CTkToplevel(self.root)
+        progress_dialog.title("Importing Inventory")
+        progress_dialog.geometry("350x120")
+        progress_dialog.transient(self.root)
+        progress_dialog.configure(fg_color=COLORS["background"])
+        
+        progress_label = ModernLabel(progress_dialog, text="Reading file...",
+                                    font=("Arial", 14, "bold"))
+        progress_label.pack(expand=True, pady=20)
+        
+        def on_progress(rows_read):
+            progress_label.configure(text=f"Processed {rows_read:,} rows...")
+            progress_dialog.update_idletasks()
+        
+        importer = InventoryImporter(self.inventory_manager)
+        try:
+            result = importer.import_file(filename, on_progress)
+        except (OSError, ValueError, csv.Error) as e:
+            messagebox.showerror("Error", f"Import failed: {str(e)}")
+            return
+        finally:
+            progress_dialog.destroy()
+        
+        if result is None:
+            messagebox.showerror("Error", "Import failed, no changes were saved")
+            return
+        
+        summary = (f"Added: {result.inserted}\n"
+                   f"Updated: {result.updated}\n"
+                   f"Rejected: {len(importer.errors) + len(result.conflicts)}")
+        for line_number, message in importer.errors[:10]:
+            summary += f"\n  line {line_number}: {message}"
+        messagebox.showinfo("Import Complete", summary)
+        self.refresh_inventory_view()
 
     def add_inventory_item(self):
         """Add new inventory item"""
@@ -1775,37 +4461,27 @@ class VeterinaryClinicApp:
 
     def edit_inventory_item(self):
         """Edit selected inventory item"""
-        selection = self.inventory_tree.selection()
-        if not selection:
+        rows = self.inventory_tree.selected_rows()
+        if not rows:
             messagebox.showwarning("Warning", "Please select an item to edit")
             return
         
-        item = self.inventory_tree.item(selection[0])
-        values = item['values']
-        item_id = values[0]
+        item_id = rows[0][0]
         
         # Get the full item details
-        items = self.inventory_manager.get_all_items()
-        selected_item = None
-        for item_obj in items:
-            if item_obj.id == item_id:
-                selected_item = item_obj
-                break
+        selected_item = self.inventory_manager.get_item(item_id)
         
         if selected_item:
             self.show_inventory_item_dialog(selected_item)
 
     def delete_inventory_item(self):
         """Delete selected inventory item"""
-        selection = self.inventory_tree.selection()
-        if not selection:
+        rows = self.inventory_tree.selected_rows()
+        if not rows:
             messagebox.showwarning("Warning", "Please select an item to delete")
             return
         
-        item = self.inventory_tree.item(selection[0])
-        values = item['values']
-        item_id = values[0]
-        item_name = values[1]
+        item_id, item_name = rows[0][:2]
         
         # Confirmation dialog
         result = messagebox.askyesno("Confirm Delete", 
@@ -1814,7 +4490,7 @@ class VeterinaryClinicApp:
         if result:
             if self.inventory_manager.delete_item(item_id):
                 messagebox.showinfo("Success", "Item deleted successfully!")
-                self.load_inventory_data()
+                self.refresh_inventory_view()
             else:
                 messagebox.showerror("Error", "Failed to delete item")
 
@@ -1913,7 +4589,7 @@ class VeterinaryClinicApp:
                 if success:
                     messagebox.showinfo("Success", 
                                       "Item added successfully!" if item is None else "Item updated successfully!")
-                    self.load_inventory_data()
+                    self.refresh_inventory_view()
                     dialog.destroy()
                 else:
                     messagebox.showerror("Error", "Failed to save item")
@@ -1962,12 +4638,18 @@ class VeterinaryClinicApp:
         
         # Products treeview
         products_columns = ("ID", "Name", "Price", "Stock", "Category")
-        self.products_tree = ttk.Treeview(products_frame, columns=products_columns, show="headings", height=15)
+        self.products_tree = VirtualTreeview(products_frame, format_row=self.product_row_values,
+                                             columns=products_columns, show="headings", height=15)
         
         for col in products_columns:
             self.products_tree.heading(col, text=col)
             self.products_tree.column(col, width=100)
         
+        self.products_tree.enable_sorting(
+            {"ID": ("id",), "Name": ("name",), "Price": ("price",), "Stock": ("stock",),
+             "Category": ("category", "name")},
+            lambda sort: self.inventory_manager.pages(QuerySpec(filters={"stock": (">", 0)}, sort=sort)))
+        
         # Style products treeview
         style = ttk.Style()
         style.configure("Products.Treeview", 
@@ -2005,6 +4687,8 @@ class VeterinaryClinicApp:
             self.cart_tree.heading(col, text=col)
             self.cart_tree.column(col, width=100)
         
+        self.cart_view = TreeReconciler(self.cart_tree)
+        
         cart_scrollbar = ttk.Scrollbar(cart_frame, orient="vertical", command=self.cart_tree.yview)
         self.cart_tree.configure(yscrollcommand=cart_scrollbar.set)
         
@@ -2063,38 +4747,22 @@ class VeterinaryClinicApp:
     
     def load_products_for_pos(self):
         """Load products for POS interface"""
-        # Clear existing data
-        for item in self.products_tree.get_children():
-            self.products_tree.delete(item)
-        
-        # Get inventory items
-        items = self.inventory_manager.get_all_items()
-        
-        # Populate products treeview
-        for item in items:
-            if item.stock > 0:  # Only show items with stock
-                self.products_tree.insert("", "end", values=(
-                    item.id,
-                    item.name,
-                    f"₱{item.price:.2f}",
-                    item.stock,
-                    item.category
-                ))
+        # Only show items with stock
+        self.products_tree.set_source(self.inventory_manager.item_pages(in_stock_only=True))
+
+    @staticmethod
+    def product_row_values(row):
+        """POS treeview values for an item_pages() row"""
+        return (row[0], row[1], f"₱{row[2]:.2f}", row[3], row[4])
     
     def add_to_cart(self):
         """Add selected product to cart"""
-        selection = self.products_tree.selection()
-        if not selection:
+        rows = self.products_tree.selected_rows()
+        if not rows:
             messagebox.showwarning("Warning", "Please select a product to add to cart")
             return
         
-        item = self.products_tree.item(selection[0])
-        values = item['values']
-        
-        item_id = values[0]
-        item_name = values[1]
-        item_price = float(values[2].replace('₱', ''))
-        item_stock = values[3]
+        item_id, item_name, item_price, item_stock, category = rows[0][:5]
         
         # Check stock
         if item_stock <= 0:
@@ -2102,7 +4770,7 @@ class VeterinaryClinicApp:
             return
         
         # Add to cart
-        self.cart.add_item(item_id, item_name, item_price, 1, values[4])
+        self.cart.add_item(item_id, item_name, item_price, 1, category)
         self.update_cart_display()
     
     def remove_from_cart(self):
@@ -2112,14 +4780,7 @@ class VeterinaryClinicApp:
             messagebox.showwarning("Warning", "Please select an item to remove from cart")
             return
         
-        item = self.cart_tree.item(selection[0])
-        values = item['values']
-        
-        # Find item ID by name (this is a simplification)
-        for cart_item in self.cart.items:
-            if cart_item.name == values[0]:
-                self.cart.remove_item(cart_item.item_id)
-                break
+        self.cart.remove_item(self.cart_view.key_of(selection[0]))
         
         self.update_cart_display()
     
@@ -2130,18 +4791,13 @@ class VeterinaryClinicApp:
     
     def update_cart_display(self):
         """Update cart display with current items and total"""
-        # Clear cart display
-        for item in self.cart_tree.get_children():
-            self.cart_tree.delete(item)
-        
-        # Add cart items
-        for item in self.cart.items:
-            self.cart_tree.insert("", "end", values=(
-                item.name,
-                f"₱{item.price:.2f}",
-                item.quantity,
-                f"₱{item.subtotal:.2f}"
-            ))
+        # Apply only the cart lines that changed
+        self.cart_view.sync((item.item_id, (
+            item.name,
+            f"₱{item.price:.2f}",
+            item.quantity,
+            f"₱{item.subtotal:.2f}"
+        )) for item in self.cart.items)
         
         # Update total
         self.total_label.configure(text=f"Total: ₱{self.cart.total:.2f}")
@@ -2159,24 +4815,21 @@ class VeterinaryClinicApp:
         
         payment_method = self.payment_method_combo.get()
         
-        # Check stock availability
-        for cart_item in self.cart.items:
-            # Get current stock from database
-            items = self.inventory_manager.get_all_items()
-            for item in items:
-                if item.id == cart_item.item_id:
-                    if item.stock < cart_item.quantity:
-                        messagebox.showerror("Error", 
-                                           f"Not enough stock for {item.name}. Available: {item.stock}")
-                        return
-                    break
-        
-        # Process sale
+        # Process sale (stock is checked and taken atomically)
         transaction_id = generate_transaction_id()
         cart_items_dict = self.cart.to_legacy_format()
         
-        if self.sales_manager.record_sale(transaction_id, cart_items_dict, 
-                                        self.cart.total, payment_method, customer_name):
+        try:
+            recorded = self.sales_manager.record_sale(transaction_id, cart_items_dict,
+                                                      self.cart.total, payment_method, customer_name)
+        except InsufficientStockError as e:
+            messagebox.showerror("Error", "Not enough stock for:\n" + "\n".join(
+                f"{name or item_id}: requested {requested}, available {available}"
+                for item_id, name, requested, available in e.shortages))
+            self.products_tree.refresh()
+            return
+        
+        if recorded:
             # Generate receipt
             receipt_text = ReceiptManager.generate_receipt_text(
                 transaction_id, 
@@ -2225,7 +4878,7 @@ class VeterinaryClinicApp:
             # Clear cart and refresh products
             self.cart.clear()
             self.update_cart_display()
-            self.load_products_for_pos()
+            self.products_tree.refresh()
             self.customer_name_entry.delete(0, 'end')
             
             messagebox.showinfo("Success", f"Sale completed! Transaction ID: {transaction_id}")
@@ -2312,11 +4965,10 @@ class VeterinaryClinicApp:
         for widget in self.report_display_frame.winfo_children():
             widget.destroy()
         
-        # Get report data
+        # Get report data from the daily rollups and SQL aggregates
         total_sales = self.calculate_total_sales()
-        total_appointments = len(self.appointment_manager.get_all_appointments())
-        low_stock_items = len([item for item in self.inventory_manager.get_all_items() if item.stock < 10])
-        total_inventory_value = sum(item.price * item.stock for item in self.inventory_manager.get_all_items())
+        total_appointments = int(DailyMetrics.total(self.db.cursor(), DailyMetrics.APPOINTMENTS))
+        _, low_stock_items, total_inventory_value = self.inventory_manager.get_stock_summary()
         
         report_cards = [
             ("💰 Total Sales", f"₱{total_sales:,.2f}", COLORS["success"]),
@@ -2332,10 +4984,7 @@ class VeterinaryClinicApp:
     def calculate_total_sales(self):
         """Calculate total sales amount"""
         try:
-            cur = self.db.cursor()
-            cur.execute("SELECT SUM(total_amount) FROM sales")
-            result = cur.fetchone()
-            return result[0] or 0.0
+            return DailyMetrics.total(self.db.cursor(), DailyMetrics.REVENUE)
         except sqlite3.Error:
             return 0.0
     
@@ -2344,20 +4993,24 @@ class VeterinaryClinicApp:
         start_date = self.start_date_entry.get()
         end_date = self.end_date_entry.get()
         
-        sales = self.sales_manager.get_sales_report(start_date, end_date)
-        
         # Clear display
         for widget in self.report_display_frame.winfo_children():
             widget.destroy()
         
         # Create sales report treeview
         columns = ("Transaction ID", "Item", "Qty", "Price", "Subtotal", "Date", "Payment Method")
-        sales_tree = ttk.Treeview(self.report_display_frame, columns=columns, show="headings", height=15)
+        sales_tree = VirtualTreeview(self.report_display_frame, format_row=self.sale_row_values,
+                                     columns=columns, show="headings", height=15)
         
         for col in columns:
             sales_tree.heading(col, text=col)
             sales_tree.column(col, width=120)
         
+        sales_tree.enable_sorting(
+            {"Transaction ID": ("transaction_id",), "Item": ("item_name",), "Qty": ("quantity",),
+             "Price": ("price",), "Subtotal": ("subtotal",), "Date": ("sale_date",)},
+            lambda sort: self.sales_manager.sale_pages(start_date, end_date, sort=sort))
+        
         scrollbar = ttk.Scrollbar(self.report_display_frame, orient="vertical", command=sales_tree.yview)
         sales_tree.configure(yscrollcommand=scrollbar.set)
         
@@ -2365,21 +5018,25 @@ class VeterinaryClinicApp:
         scrollbar.grid(row=0, column=1, sticky="ns")
         
         # Populate sales data
-        total_sales = 0
-        for sale in sales:
-            sales_tree.insert("", "end", values=(
-                sale[1] if len(sale) > 1 else "",  # transaction_id
-                sale[3] if len(sale) > 3 else "",  # item_name
-                sale[4] if len(sale) > 4 else "",  # quantity
-                f"₱{sale[5]:.2f}" if len(sale) > 5 and sale[5] else "₱0.00",  # price
-                f"₱{sale[6]:.2f}" if len(sale) > 6 and sale[6] else "₱0.00",  # subtotal
-                sale[9] if len(sale) > 9 else "",  # sale_date
-                sale[7] if len(sale) > 7 else ""   # payment_method
-            ))
-            total_sales += sale[6] if len(sale) > 6 and sale[6] else 0  # subtotal
+        sales_tree.set_source(self.sales_manager.sale_pages(start_date, end_date))
         
         # Add total row
-        sales_tree.insert("", "end", values=("TOTAL", "", "", "", f"₱{total_sales:.2f}", "", ""))
+        total_sales = self.sales_manager.total_revenue(start_date, end_date)
+        ModernLabel(self.report_display_frame, text=f"TOTAL: ₱{total_sales:.2f}",
+                   font=("Arial", 14, "bold")).grid(row=1, column=0, padx=10, pady=(0, 10), sticky="e")
+    
+    @staticmethod
+    def sale_row_values(sale):
+        """Treeview values for a get_sales_report() row"""
+        return (
+            sale[1],  # transaction_id
+            sale[3],  # item_name
+            sale[4],  # quantity
+            f"₱{sale[5]:.2f}" if sale[5] else "₱0.00",  # price
+            f"₱{sale[6]:.2f}" if sale[6] else "₱0.00",  # subtotal
+            sale[10],  # sale_date
+            sale[8]   # payment_method
+        )
     
     def generate_inventory_report(self):
         """Generate and display inventory report"""
@@ -2405,7 +5062,7 @@ class VeterinaryClinicApp:
         
         # Populate inventory data
         for item in items:
-            status = "✅ OK" if item.stock >= 10 else "⚠️ Low" if item.stock > 0 else "❌ Out"
+            status = "✅ OK" if item.stock >= LOW_STOCK_THRESHOLD else "⚠️ Low" if item.stock > 0 else "❌ Out"
             inventory_tree.insert("", "end", values=(
                 item.id,
                 item.name,
@@ -2510,7 +5167,7 @@ class VeterinaryClinicApp:
                     sales = self.sales_manager.get_sales_report()
                     writer.writerow(["Transaction ID", "Item Name", "Quantity", "Price", "Subtotal", "Total Amount", "Payment Method", "Customer Name", "Sale Date"])
                     for sale in sales:
-                        writer.writerow(sale[1:10])  # Skip ID column
+                        writer.writerow([sale[1]] + list(sale[3:11]))  # Skip line and item IDs
                 
                 elif data_type == "inventory":
                     # Export inventory data
@@ -2524,10 +5181,8 @@ class VeterinaryClinicApp:
                 
                 elif data_type == "appointments":
                     # Export appointments data
-                    appointments = self.appointment_manager.get_all_appointments()
                     writer.writerow(["Appointment ID", "Patient Name", "Owner Name", "Animal Type", "Date", "Notes", "Status", "Total Amount"])
-                    for apt in appointments:
-                        writer.writerow(apt[:8])  # Use first 8 columns
+                    writer.writerows(self.appointment_manager.iter_appointments())
         
             return True
         except Exception as e:
@@ -2883,7 +5538,7 @@ class VeterinaryClinicApp:
         # Database actions frame
         db_actions_frame = ModernFrame(parent)
         db_actions_frame.grid(row=1, column=0, sticky="ew", padx=10, pady=10)
-        db_actions_frame.grid_columnconfigure((0, 1), weight=1)
+        db_actions_frame.grid_columnconfigure((0, 1, 2), weight=1)
         
         backup_btn = ModernButton(db_actions_frame, text="💾 Backup Database", 
                                  command=self.backup_database,
@@ -2895,6 +5550,11 @@ class VeterinaryClinicApp:
                                   fg_color=COLORS["warning"])
         restore_btn.grid(row=0, column=1, padx=10, pady=10, sticky="ew")
         
+        rebuild_btn = ModernButton(db_actions_frame, text="📊 Rebuild Report Totals", 
+                                  command=self.rebuild_report_totals,
+                                  fg_color=COLORS["primary"])
+        rebuild_btn.grid(row=0, column=2, padx=10, pady=10, sticky="ew")
+        
         # Database info
         info_frame = ModernFrame(parent)
         info_frame.grid(row=2, column=0, sticky="ew", padx=10, pady=10)
@@ -2905,7 +5565,7 @@ class VeterinaryClinicApp:
             cur = self.db.cursor()
             
             # Table counts
-            tables = ["users", "inventory", "appointments", "sales"]
+            tables = ["users", "inventory", "appointments", "sales_transactions"]
             table_counts = {}
             
             for table in tables:
@@ -2925,7 +5585,7 @@ class VeterinaryClinicApp:
             ModernLabel(info_frame, text=str(table_counts["appointments"])).grid(row=3, column=1, sticky="w", padx=10, pady=5)
             
             ModernLabel(info_frame, text="Sales:").grid(row=4, column=0, sticky="w", padx=10, pady=5)
-            ModernLabel(info_frame, text=str(table_counts["sales"])).grid(row=4, column=1, sticky="w", padx=10, pady=5)
+            ModernLabel(info_frame, text=str(table_counts["sales_transactions"])).grid(row=4, column=1, sticky="w", padx=10, pady=5)
             
         except sqlite3.Error as e:
             ModernLabel(info_frame, text=f"Error loading database info: {str(e)}").grid(row=0, column=0, columnspan=2, padx=10, pady=5)
@@ -2940,21 +5600,24 @@ class VeterinaryClinicApp:
         
         if filename:
             try:
-                # Close current connection
-                self.db.close()
-                
-                # Copy database file
-                import shutil
-                shutil.copy2(DB_FILE, filename)
-                
-                # Reopen connection
-                self.db = get_db()
+                # Online backup: also captures pages still in the WAL file,
+                # which a plain file copy of DB_FILE would miss
+                backup_conn = sqlite3.connect(filename)
+                try:
+                    self.db.backup(backup_conn)
+                finally:
+                    backup_conn.close()
                 
                 messagebox.showinfo("Success", f"Database backed up to {filename}")
             except Exception as e:
                 messagebox.showerror("Error", f"Backup failed: {str(e)}")
-                # Reopen connection on error
-                self.db = get_db()
+    
+    def rebuild_report_totals(self):
+        """Recompute the daily report rollups from the raw tables"""
+        if rebuild_daily_metrics():
+            messagebox.showinfo("Success", "Report totals rebuilt successfully!")
+        else:
+            messagebox.showerror("Error", "Failed to rebuild report totals")
     
     def restore_database(self):
         """Restore database from backup"""
@@ -2968,26 +5631,24 @@ class VeterinaryClinicApp:
             
             if result:
                 try:
-                    # Close current connection
-                    self.db.close()
-                    
-                    # Replace database file
-                    import shutil
-                    shutil.copy2(filename, DB_FILE)
+                    # Copy the backup into the shared connection page by page,
+                    # so the WAL and other readers stay consistent
+                    backup_conn = sqlite3.connect(filename)
+                    try:
+                        backup_conn.backup(self.db)
+                    finally:
+                        backup_conn.close()
                     
-                    # Reopen connection
-                    self.db = get_db()
-                    self.inventory_manager = InventoryManager(self.db)
-                    self.appointment_manager = AppointmentManager(self.db)
-                    self.sales_manager = SalesManager(self.db)
+                    # Older backups may predate the current schema
+                    run_migrations(self.db)
+                    INVENTORY_CACHE.invalidate()
+                    SCHEDULE_INDEX.invalidate()
                     
                     messagebox.showinfo("Success", "Database restored successfully!")
                     messagebox.showinfo("Info", "Please restart the application for changes to take effect.")
                     
                 except Exception as e:
                     messagebox.showerror("Error", f"Restore failed: {str(e)}")
-                    # Reopen connection on error
-                    self.db = get_db()
     
     def create_security_tab(self, parent):
         """Create security settings tab"""
@@ -3045,18 +5706,46 @@ class VeterinaryClinicApp:
     
     def __del__(self):
         """Cleanup when application is closed"""
+        if getattr(self, 'inventory_search', None) is not None:
+            self.inventory_search.stop()
         if hasattr(self, 'db'):
             try:
-                self.db.close()
+                close_db()
             except:
                 pass
 
 # ==================== APPLICATION START ====================
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=APP_TITLE)
+    db_group = parser.add_mutually_exclusive_group()
+    db_group.add_argument("--db", help=f"database file to use (default: {DB_FILE})")
+    db_group.add_argument("--test-db", action="store_true",
+                          help=f"use the test database {TEST_DB_FILE}, cleared on start")
+    db_group.add_argument("--memory", action="store_true",
+                          help="use a throwaway in-memory database")
+    parser.add_argument("--rebuild-metrics", action="store_true",
+                        help="recompute the daily report rollups and exit")
+    args = parser.parse_args()
+
+    if args.db:
+        use_database(args.db)
+    elif args.test_db:
+        use_database(TEST_DB_FILE)
+    elif args.memory:
+        use_database(MEMORY_DB)
+
+    if args.rebuild_metrics:
+        init_db()
+        raise SystemExit(0 if rebuild_daily_metrics() else 1)
+
     try:
         print("Starting Veterinary Clinic Management System...")
         app = VeterinaryClinicApp()
+        if args.test_db:
+            clear_test_data()
         app.run()
     except Exception as e:
         print(f"Application error: {e}")
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bangay_semproj as app  # noqa: E402
+
+
+@pytest.fixture
+def clinic_db(tmp_path):
+    """A freshly migrated clinic database in tmp_path, selected as DB_FILE"""
+    previous = app.DB_FILE
+    app.use_database(str(tmp_path / "vetclinic_test.db"))
+    app.init_db()
+    yield app.get_db()
+    app.close_db()
+    app.use_database(previous)
@@ -0,0 +1,110 @@
+"""Multiprocess checkout stress test.
+
+Several processes check out random carts against the same few items through
+SalesManager.record_sale() until stock runs out, then the totals are checked:
+stock never goes below zero, and for every item the units sold plus the
+stock remaining equals the starting stock.
+
+    python tests/stress_checkout.py --processes 8 --checkouts 500
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bangay_semproj as app  # noqa: E402
+
+
+def checkout_worker(db_path, worker_id, checkouts, item_ids, results):
+    """Run checkouts random carts; put (sold units by item id, sales, shortages) on results"""
+    app.use_database(db_path)
+    sales = app.SalesManager(app.get_db())
+    rnd = random.Random(worker_id)
+    sold, completed, short = {}, 0, 0
+    for n in range(checkouts):
+        cart = {}
+        for _ in range(rnd.randint(1, 3)):
+            item_id = rnd.choice(item_ids)
+            cart[item_id] = cart.get(item_id, 0) + rnd.randint(1, 3)
+        items = [{'id': item_id, 'name': f"Stress {item_id}", 'qty': qty, 'price': 1.0, 'subtotal': float(qty)}
+                 for item_id, qty in cart.items()]
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                recorded = sales.record_sale(f"STRESS-{worker_id}-{n}", items, float(sum(cart.values())), "Cash")
+        except app.InsufficientStockError:
+            short += 1
+            continue
+        if not recorded:
+            raise RuntimeError(f"worker {worker_id}: checkout {n} failed")
+        completed += 1
+        for item_id, qty in cart.items():
+            sold[item_id] = sold.get(item_id, 0) + qty
+    app.close_db()
+    results.put((sold, completed, short))
+
+
+def run(db_path, processes=4, checkouts=200, items=5, stock=300):
+    """Run the stress test against a new database at db_path and check the totals"""
+    app.use_database(db_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.init_db()
+    db = app.get_db()
+    item_ids = [db.execute("INSERT INTO inventory (name, price, stock, category) VALUES (?, 1.0, ?, 'Stress')",
+                           (f"Stress {i}", stock)).lastrowid for i in range(items)]
+    db.commit()
+    app.close_db()
+
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=checkout_worker,
+                                       args=(db_path, worker_id, checkouts, item_ids, results))
+               for worker_id in range(processes)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    reports = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    assert all(worker.exitcode == 0 for worker in workers), "a checkout worker crashed"
+
+    conn = sqlite3.connect(db_path)
+    remaining = dict(conn.execute("SELECT id, stock FROM inventory WHERE category = 'Stress'"))
+    recorded = dict(conn.execute("SELECT item_id, SUM(quantity) FROM sale_lines GROUP BY item_id"))
+    conn.close()
+
+    reported = {}
+    for sold, _, _ in reports:
+        for item_id, qty in sold.items():
+            reported[item_id] = reported.get(item_id, 0) + qty
+    for item_id in item_ids:
+        assert remaining[item_id] >= 0, f"item {item_id} oversold: stock {remaining[item_id]}"
+        assert recorded.get(item_id, 0) + remaining[item_id] == stock, f"item {item_id}: stock not conserved"
+        assert reported.get(item_id, 0) == recorded.get(item_id, 0), f"item {item_id}: lost sale lines"
+    return {"completed": sum(report[1] for report in reports),
+            "short": sum(report[2] for report in reports),
+            "seconds": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--checkouts", type=int, default=500, help="checkouts per process")
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--stock", type=int, default=2000, help="starting stock per item")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        totals = run(os.path.join(tmp, "stress.db"), args.processes, args.checkouts, args.items, args.stock)
+    print(f"{args.processes} processes: {totals['completed']} checkouts, {totals['short']} refused as short, "
+          f"{totals['completed'] / totals['seconds']:.0f} checkouts/s; stock conserved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import bangay_semproj as app
+
+
+def stock(db, item_id):
+    return db.execute("SELECT stock FROM inventory WHERE id = ?", (item_id,)).fetchone()[0]
+
+
+def add_gauze(db, stock=10):
+    cur = db.execute("INSERT INTO inventory (name, price, stock, category) VALUES ('Gauze', 2.5, ?, 'Supplies')",
+                     (stock,))
+    db.commit()
+    return cur.lastrowid
+
+
+def book(db, appointment_id, item_id, qty):
+    appointment = app.Appointment(appointment_id, "Rex", "Ana", "Dog")
+    appointment.items = [{'id': item_id, 'name': "Gauze", 'qty': qty, 'price': 2.5, 'subtotal': 2.5 * qty}]
+    assert app.AppointmentManager(db).record_appointment(appointment)
+
+
+def test_cancel_returns_consumables_and_reinstate_takes_them_again(clinic_db):
+    manager = app.AppointmentManager(clinic_db)
+    item_id = add_gauze(clinic_db)
+    book(clinic_db, "APT-1", item_id, 3)
+    assert stock(clinic_db, item_id) == 7
+
+    assert manager.update_appointment_status("APT-1", "CANCELLED")
+    assert stock(clinic_db, item_id) == 10
+    assert manager.update_appointment_status("APT-1", "CANCELLED")
+    assert stock(clinic_db, item_id) == 10
+
+    assert manager.update_appointment_status("APT-1", "SCHEDULED")
+    assert stock(clinic_db, item_id) == 7
+    assert manager.update_appointment_status("APT-1", "COMPLETED")
+    assert stock(clinic_db, item_id) == 7
+
+
+def test_reinstate_is_refused_when_the_stock_has_gone(clinic_db):
+    manager = app.AppointmentManager(clinic_db)
+    item_id = add_gauze(clinic_db)
+    book(clinic_db, "APT-1", item_id, 3)
+    assert manager.update_appointment_status("APT-1", "CANCELLED")
+    book(clinic_db, "APT-2", item_id, 9)
+
+    assert not manager.update_appointment_status("APT-1", "SCHEDULED")
+    assert stock(clinic_db, item_id) == 1
+    status = clinic_db.execute("SELECT status FROM appointments WHERE appointment_id = 'APT-1'").fetchone()[0]
+    assert status == "CANCELLED"
+
+
+def test_delete_returns_consumables_once(clinic_db):
+    manager = app.AppointmentManager(clinic_db)
+    item_id = add_gauze(clinic_db)
+    book(clinic_db, "APT-1", item_id, 3)
+    book(clinic_db, "APT-2", item_id, 2)
+    assert stock(clinic_db, item_id) == 5
+
+    assert manager.delete_appointment("APT-1")
+    assert stock(clinic_db, item_id) == 8
+    assert manager.update_appointment_status("APT-2", "CANCELLED")
+    assert manager.delete_appointment("APT-2")
+    assert stock(clinic_db, item_id) == 10
+    assert app.INVENTORY_CACHE.get(clinic_db, item_id).stock == 10
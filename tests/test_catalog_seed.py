@@ -0,0 +1,32 @@
+import bangay_semproj as app
+
+RABIES = "Rabies Vaccine (1 dose)"
+
+
+def rows_named(db, name):
+    return db.execute("SELECT brand, price, stock, catalog_key FROM inventory WHERE name = ? ORDER BY id",
+                      (name,)).fetchall()
+
+
+def test_same_named_product_from_another_brand_survives_reseeding(clinic_db):
+    assert app.populate_initial_inventory()
+    inventory = app.InventoryManager(clinic_db)
+    assert inventory.add_item(app.Medicine(name=RABIES, price=999.0, stock=7, category="Dog Medicines",
+                                           brand="OtherBrand", animal_type="Dog", dosage="1ml",
+                                           expiration_date="2030-01-01"))
+    clinic_db.execute("UPDATE inventory SET stock = 12 WHERE catalog_key = ?", (f"Dog Medicines/{RABIES}",))
+    clinic_db.commit()
+
+    assert app.populate_initial_inventory(force=True)
+
+    assert rows_named(clinic_db, RABIES) == [("Generic", 350.0, 12, f"Dog Medicines/{RABIES}"),
+                                             ("OtherBrand", 999.0, 7, None)]
+
+
+def test_reseeding_does_not_duplicate_catalog_items(clinic_db):
+    assert app.populate_initial_inventory()
+    count = clinic_db.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
+    assert count == len(app.catalog_seed_rows())
+
+    assert app.populate_initial_inventory(force=True)
+    assert clinic_db.execute("SELECT COUNT(*) FROM inventory").fetchone()[0] == count
@@ -0,0 +1,77 @@
+import multiprocessing
+import threading
+import types
+
+import bangay_semproj as app
+
+
+def strictly_increasing(ids):
+    return all(a < b for a, b in zip(ids, ids[1:]))
+
+
+def fake_clock(monkeypatch, milliseconds):
+    """Make the generator read the given wall-clock milliseconds, one per id"""
+    readings = iter(milliseconds)
+    clock = types.SimpleNamespace(time_ns=lambda: (app.IdGenerator.EPOCH_MS + next(readings)) * 1000000)
+    monkeypatch.setattr(app, "time", clock)
+
+
+def test_ids_from_many_threads_are_unique_and_ordered_per_thread():
+    generator = app.IdGenerator(node=7)
+    results = [None] * 8
+
+    def mint(slot):
+        results[slot] = [generator.next_int() for _ in range(5000)]
+
+    threads = [threading.Thread(target=mint, args=(slot,)) for slot in range(len(results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(strictly_increasing(ids) for ids in results)
+    assert len(set().union(*results)) == 8 * 5000
+
+
+def mint_in_child(results):
+    results.put([app.generate_appointment_id() for _ in range(2000)])
+
+
+def test_ids_from_many_processes_are_unique(clinic_db):
+    app.ID_GENERATOR.reset()
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=mint_in_child, args=(results,)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    minted = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    app.ID_GENERATOR.reset()
+
+    assert all(strictly_increasing(ids) for ids in minted)
+    assert len(set().union(*minted)) == 4 * 2000
+    # Each process claimed its own node from the shared database
+    node_mask = (1 << app.IdGenerator.NODE_BITS) - 1
+    nodes = {int(ids[0][3:], 16) >> app.IdGenerator.SEQUENCE_BITS & node_mask for ids in minted}
+    assert len(nodes) == 4
+
+
+def test_clock_stepping_back_keeps_ids_increasing(monkeypatch):
+    fake_clock(monkeypatch, [1000, 1000, 995, 990, 1000, 1001, 1002])
+    generator = app.IdGenerator(node=1)
+    ids = [generator.next_int() for _ in range(7)]
+
+    assert strictly_increasing(ids)
+    # While the clock is behind, ids keep the last millisecond seen
+    assert [i >> app.IdGenerator.TIME_SHIFT for i in ids] == [1000, 1000, 1000, 1000, 1000, 1001, 1002]
+
+
+def test_sequence_overflow_borrows_the_next_millisecond(monkeypatch):
+    per_ms = app.IdGenerator.SEQUENCE_MASK + 1
+    fake_clock(monkeypatch, [500] * (per_ms + 1) + [501])
+    generator = app.IdGenerator(node=1)
+    ids = [generator.next_int() for _ in range(per_ms + 2)]
+
+    assert strictly_increasing(ids)
+    assert ids[per_ms] >> app.IdGenerator.TIME_SHIFT == 501
+    assert ids[-1] >> app.IdGenerator.TIME_SHIFT == 501
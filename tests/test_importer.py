@@ -0,0 +1,26 @@
+import json
+
+import pytest
+
+import bangay_semproj as app
+
+
+def test_json_lines_file_is_imported(clinic_db, tmp_path):
+    path = tmp_path / "catalog.json"
+    path.write_text("\n".join(json.dumps({"name": f"Chew {i}", "price": 10 + i, "category": "Treats"})
+                              for i in range(3)) + "\n", encoding="utf-8")
+    importer = app.InventoryImporter(app.InventoryManager(clinic_db))
+
+    result = importer.import_file(str(path))
+
+    assert (result.inserted, importer.errors) == (3, [])
+
+
+def test_json_array_file_fails_with_a_clear_error(clinic_db, tmp_path):
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps([{"name": "Chew", "price": 10, "category": "Treats"}], indent=2), encoding="utf-8")
+    importer = app.InventoryImporter(app.InventoryManager(clinic_db))
+
+    with pytest.raises(ValueError, match="JSON Lines"):
+        importer.import_file(str(path))
+    assert clinic_db.execute("SELECT COUNT(*) FROM inventory WHERE category = 'Treats'").fetchone()[0] == 0
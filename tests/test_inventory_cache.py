@@ -0,0 +1,45 @@
+import bangay_semproj as app
+
+
+def add_item(db, name, stock=50, category="Supplies"):
+    cur = db.execute("INSERT INTO inventory (name, price, stock, category) VALUES (?, 10.0, ?, ?)",
+                     (name, stock, category))
+    db.commit()
+    return cur.lastrowid
+
+
+def test_commits_from_another_connection_are_seen(clinic_db):
+    item_id = add_item(clinic_db, "Gauze")
+    inventory = app.InventoryManager(clinic_db)
+    assert inventory.get_item(item_id).stock == 50
+
+    other_terminal = app.connect_db()
+    other_terminal.execute("UPDATE inventory SET stock = stock - 20 WHERE id = ?", (item_id,))
+    other_terminal.commit()
+    other_terminal.close()
+
+    assert inventory.get_item(item_id).stock == 30
+    assert [item.stock for item in inventory.get_all_items() if item.id == item_id] == [30]
+
+
+def test_reads_without_outside_commits_are_cache_hits(clinic_db):
+    item_id = add_item(clinic_db, "Gauze")
+    inventory = app.InventoryManager(clinic_db)
+    inventory.get_item(item_id)
+    misses = app.INVENTORY_CACHE.stats()['misses']
+
+    assert inventory.update_item_stock(item_id, 5)
+    assert inventory.get_item(item_id).stock == 45
+    inventory.get_all_items()
+    assert app.INVENTORY_CACHE.stats()['misses'] == misses
+
+
+def test_items_with_missing_category_or_name_are_listed(clinic_db):
+    add_item(clinic_db, "Gauze")
+    add_item(clinic_db, "Collar", category=None)
+    add_item(clinic_db, None, category="Supplies")
+
+    items = app.InventoryManager(clinic_db).get_all_items()
+
+    assert [(item.category, item.name) for item in items] == [(None, "Collar"), ("Supplies", None),
+                                                              ("Supplies", "Gauze")]
@@ -0,0 +1,133 @@
+import pytest
+
+import bangay_semproj as app
+
+
+def page_all(source, page_size=3):
+    """Every row of a KeysetSource, walked page by page"""
+    rows, after = [], None
+    while True:
+        page = source.page(after, page_size)
+        rows.extend(row for key, row in page)
+        if len(page) < page_size:
+            return rows
+        after = page[-1][0]
+
+
+@pytest.fixture
+def inventory(clinic_db):
+    rows = [(f"Item {i:02d}", 1.0 + i, i, "Supplies",
+             None if i % 3 == 0 else f"Brand {i % 4}",
+             None if i % 2 else "Dog",
+             None if i % 5 == 0 else f"2030-01-{i + 1:02d}") for i in range(12)]
+    clinic_db.executemany("""INSERT INTO inventory (name, price, stock, category, brand, animal_type,
+                          expiration_date) VALUES (?, ?, ?, ?, ?, ?, ?)""", rows)
+    clinic_db.commit()
+    app.INVENTORY_CACHE.invalidate()
+    return app.InventoryManager(clinic_db)
+
+
+@pytest.mark.parametrize("sort", ["brand", "-brand", "animal_type", "-animal_type",
+                                  "expiration_date", "-expiration_date"])
+def test_inventory_pages_include_null_sort_keys(inventory, sort):
+    rows = page_all(inventory.pages(app.QuerySpec(sort=sort)))
+    ids = [row[0] for row in rows]
+    assert sorted(ids) == sorted(item.id for item in inventory.get_all_items())
+    assert len(ids) == 12
+
+    column = list(app.InventoryManager.QUERY_COLUMNS).index(sort.lstrip("-"))
+    keys = [row[column] or "" for row in rows]
+    assert keys == sorted(keys, reverse=sort.startswith("-"))
+
+
+def test_query_cursor_crosses_null_keys(inventory):
+    seen, cursor = [], None
+    while True:
+        page = inventory.query(app.QuerySpec(sort="brand", cursor=cursor, page_size=5))
+        seen.extend(row[0] for row in page.rows)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 12
+
+
+def test_appointment_and_sale_pages_include_null_sort_keys(clinic_db):
+    clinic_db.executemany("""INSERT INTO appointments (appointment_id, patient_name, owner_name,
+                          animal_type, date, status, total_amount) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                          [(f"APT{i}", None if i % 2 else f"Pet {i}", None if i % 3 else f"Owner {i}",
+                            None, f"2025-01-{i + 1:02d} 10:00:00", "SCHEDULED", 100.0) for i in range(10)])
+    clinic_db.executemany("""INSERT INTO sales_transactions (transaction_id, total_amount, payment_method,
+                          sale_date) VALUES (?, ?, ?, ?)""",
+                          [(f"TXN{i}", 5.0, None if i % 2 else "Cash", f"2025-01-{i + 1:02d}") for i in range(10)])
+    clinic_db.executemany("""INSERT INTO sale_lines (transaction_id, item_id, item_name, quantity, price,
+                          subtotal) VALUES (?, ?, ?, ?, ?, ?)""",
+                          [(f"TXN{i}", None, None, 1, 5.0, 5.0) for i in range(10)])
+    clinic_db.commit()
+
+    appointments = app.AppointmentManager(clinic_db)
+    for sort in ("patient_name", "-owner_name", "animal_type"):
+        assert len(page_all(appointments.pages(app.QuerySpec(sort=sort)))) == 10
+    sales = app.SalesManager(clinic_db)
+    for sort in ("payment_method", "-payment_method", "item_name"):
+        assert len(page_all(sales.pages(app.QuerySpec(sort=sort)))) == 10
+
+
+def test_default_inventory_order_pages_past_null_category_and_name(clinic_db):
+    clinic_db.executemany("INSERT INTO inventory (name, price, stock, category) VALUES (?, 1.0, 1, ?)",
+                          [(None if i % 4 == 0 else f"Item {i % 3}", None if i % 5 == 0 else "Supplies")
+                           for i in range(15)])
+    clinic_db.commit()
+
+    rows = page_all(app.InventoryManager(clinic_db).pages())
+
+    assert len({row[0] for row in rows}) == len(rows) == 15
+    keys = [(row[4] or "", row[1] or "") for row in rows]
+    assert keys == sorted(keys)
+
+
+GRID_SORTS = [
+    ("inventory", ["id", "name", "price", "stock", ("category", "name"), "brand", "animal_type", "expiration_date"]),
+    ("appointments", ["appointment_id", "patient_name", "owner_name", "animal_type", ("date", "appointment_id"),
+                      "status", "total_amount"]),
+    ("sales", ["transaction_id", "item_name", "quantity", "price", "subtotal"]),
+]
+
+
+@pytest.mark.parametrize("grid, sorts", GRID_SORTS)
+def test_grid_sorts_page_from_an_index(clinic_db, grid, sorts):
+    manager = {"inventory": app.InventoryManager, "appointments": app.AppointmentManager,
+               "sales": app.SalesManager}[grid](clinic_db)
+    for sort in sorts:
+        for prefix in ("", "-"):
+            spec = app.QuerySpec(sort=tuple(prefix + column for column in
+                                            (sort if isinstance(sort, tuple) else (sort,))))
+            source = manager.pages(spec)
+            # Every query a following page may run: each number of leading keys held equal
+            for fixed in range(len(source.key_columns)):
+                sql, params = source._query(", ".join(source.columns), ("",) * len(source.key_columns),
+                                            False, 50, fixed)
+                plan = " ".join(row[3] for row in clinic_db.execute("EXPLAIN QUERY PLAN " + sql, params))
+                assert "TEMP B-TREE" not in plan, (grid, spec.sort, fixed, plan)
+                assert plan.startswith("SEARCH"), (grid, spec.sort, fixed, plan)
+
+
+def test_reverse_pages_walk_back_to_the_first_row(inventory):
+    source = inventory.pages(app.QuerySpec(sort=("category", "name")))
+    forward = []
+    after = None
+    while True:
+        page = source.page(after, 4)
+        forward.extend(page)
+        if len(page) < 4:
+            break
+        after = page[-1][0]
+
+    backward, before = [], forward[-1][0]
+    while True:
+        page = source.page(before, 4, reverse=True)
+        backward.extend(page)
+        if len(page) < 4:
+            break
+        before = page[-1][0]
+
+    assert [row for key, row in backward] == [row for key, row in reversed(forward[:-1])]
@@ -0,0 +1,60 @@
+import pytest
+
+import bangay_semproj as app
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """A database with only the original (pre-migration) schema; call app.init_db() to migrate it"""
+    previous = app.DB_FILE
+    app.use_database(str(tmp_path / "vetclinic_legacy.db"))
+    conn = app.get_db()
+    app._create_base_schema(conn.cursor())
+    conn.commit()
+    yield conn
+    app.close_db()
+    app.use_database(previous)
+
+
+def test_colliding_legacy_transaction_ids_are_split(legacy_db):
+    legacy_db.executemany("""INSERT INTO sales (transaction_id, item_id, item_name, quantity, price, subtotal,
+                          total_amount, payment_method, customer_name, sale_date)
+                          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", [
+        ("TXN20240101120000", 1, "Rabies Vaccine", 2, 50.0, 100.0, 100.0, "Cash", "Ann", "2024-01-01 12:00:00"),
+        ("TXN20240101120000", 2, "Dewormer", 1, 130.0, 130.0, 130.0, "Card", "Bob", "2024-01-01 12:00:00"),
+        ("TXN20240101120001", 2, "Dewormer", 1, 10.0, 10.0, 30.0, "Cash", "", "2024-01-01 12:00:01"),
+        ("TXN20240101120001", 3, "Shampoo", 2, 10.0, 20.0, 30.0, "Cash", "", "2024-01-01 12:00:01"),
+    ])
+    legacy_db.commit()
+
+    app.init_db()
+
+    headers = legacy_db.execute("""SELECT transaction_id, total_amount, payment_method, customer_name
+                                FROM sales_transactions ORDER BY transaction_id""").fetchall()
+    assert headers == [("TXN20240101120000", 100.0, "Cash", "Ann"),
+                       ("TXN20240101120000-2", 130.0, "Card", "Bob"),
+                       ("TXN20240101120001", 30.0, "Cash", "")]
+    lines = legacy_db.execute("SELECT transaction_id, item_name FROM sale_lines ORDER BY id").fetchall()
+    assert lines == [("TXN20240101120000", "Rabies Vaccine"), ("TXN20240101120000-2", "Dewormer"),
+                     ("TXN20240101120001", "Dewormer"), ("TXN20240101120001", "Shampoo")]
+    assert app.SalesManager(legacy_db).total_revenue() == 260.0
+
+
+def test_colliding_legacy_appointment_ids_are_split(legacy_db):
+    legacy_db.executemany("""INSERT INTO appointments (appointment_id, patient_name, owner_name, animal_type,
+                          service, qty, price, subtotal, date, status, total_amount)
+                          VALUES (?, ?, ?, 'Dog', ?, 1, ?, ?, '2024-01-01 12:00:00', 'SCHEDULED', ?)""", [
+        ("APT20240101120000", "Rex", "Ann", "Checkup", 300.0, 300.0, 500.0),
+        ("APT20240101120000", "Rex", "Ann", "Vaccination", 200.0, 200.0, 500.0),
+        ("APT20240101120000", "Tom", "Bob", "Grooming", 400.0, 400.0, 400.0),
+    ])
+    legacy_db.commit()
+
+    app.init_db()
+
+    headers = legacy_db.execute("""SELECT appointment_id, patient_name, total_amount FROM appointments
+                                ORDER BY appointment_id""").fetchall()
+    assert headers == [("APT20240101120000", "Rex", 500.0), ("APT20240101120000-2", "Tom", 400.0)]
+    services = legacy_db.execute("""SELECT appointment_id, COUNT(*) FROM appointment_services
+                                 GROUP BY appointment_id ORDER BY appointment_id""").fetchall()
+    assert services == [("APT20240101120000", 2), ("APT20240101120000-2", 1)]
@@ -0,0 +1,13 @@
+import bangay_semproj as app
+import stress_checkout
+
+
+def test_concurrent_checkouts_never_oversell(tmp_path):
+    previous = app.DB_FILE
+    try:
+        # Little stock for the demand, so most workers race for the last units
+        totals = stress_checkout.run(str(tmp_path / "stress.db"), processes=4, checkouts=60, items=3, stock=120)
+    finally:
+        app.use_database(previous)
+    assert totals["completed"] > 0
+    assert totals["short"] > 0